@@ -1,164 +1,2899 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import mysql.connector
 import hashlib
-from datetime import datetime
-from PIL import Image, ImageTk
+import hmac
+import secrets
+from datetime import datetime, date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from collections import namedtuple, deque, OrderedDict
 import os
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+import sys
+import csv
+import re
+import json
+import random
+import tempfile
+import argparse
+import threading
+import time
+import atexit
+import queue
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps, lru_cache
+
+# GUI and imaging modules are imported by launch_gui(), openpyxl by the
+# import/export functions and mysql.connector by the MySQL storage engine, so
+# command-line jobs and SQLite installs start without loading them
+tk = ttk = messagebox = filedialog = None
+Image = ImageTk = None
+
+# SCHEMA MIGRATIONS
+# Ordered (version, description, steps). Each migration runs once and is recorded
+# in schema_version; a step is either a SQL string or a callable taking a cursor.
+# MySQL commits each DDL statement on its own, so a migration that failed part way
+# is retried with some of its steps already applied; every step must be safe to repeat.
+# Never edit a migration that has shipped - append a new one instead, to both
+# MIGRATIONS (MySQL) and SQLITE_MIGRATIONS.
+MIGRATIONS = [
+    (1, "Create users, categories and expenses tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            fullname VARCHAR(50) NOT NULL,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            role ENUM('admin','user') DEFAULT 'user'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            category_id INT AUTO_INCREMENT PRIMARY KEY,
+            category_name VARCHAR(50) UNIQUE NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            spent_on DATE NOT NULL,
+            note VARCHAR(255),
+            category_ids INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (category_ids) REFERENCES categories(category_id)
+        )
+        """,
+    ]),
+    (2, "Add expense listing indexes", [
+        # Serves the unfiltered page: equality on user_id, then ordered by (spent_on, id)
+        lambda cur: create_index_if_missing(cur, "expenses", "idx_expenses_user_date",
+                                            "CREATE INDEX idx_expenses_user_date ON expenses (user_id, spent_on, id)"),
+        # Serves the category-filtered page and covers SUM(amount) for the totals
+        lambda cur: create_index_if_missing(cur, "expenses", "idx_expenses_user_cat_date",
+                                            "CREATE INDEX idx_expenses_user_cat_date ON expenses (user_id, category_ids, spent_on, id, amount)"),
+    ]),
+    (3, "Add data version stamps", [
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT IGNORE INTO data_versions (name, version) VALUES ('categories', 1)",
+    ]),
+    (4, "Add full-text index on expense notes", [
+        # Serves note search; words shorter than innodb_ft_min_token_size are not indexed
+        lambda cur: create_index_if_missing(cur, "expenses", "ft_expenses_note",
+                                            "CREATE FULLTEXT INDEX ft_expenses_note ON expenses (note)"),
+    ]),
+    (5, "Add monthly expense rollups", [
+        # ym is YYYYMM; category_key is the category id, or 0 for uncategorized
+        # expenses since a primary key column cannot be NULL
+        """
+        CREATE TABLE IF NOT EXISTS expense_rollups (
+            user_id INT NOT NULL,
+            ym INT NOT NULL,
+            category_key INT NOT NULL,
+            total DECIMAL(14,2) NOT NULL DEFAULT 0,
+            expense_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, ym, category_key)
+        )
+        """,
+        """
+        INSERT INTO expense_rollups (user_id, ym, category_key, total, expense_count)
+        SELECT user_id, YEAR(spent_on) * 100 + MONTH(spent_on), COALESCE(category_ids, 0), SUM(amount), COUNT(*)
+        FROM expenses
+        GROUP BY user_id, YEAR(spent_on) * 100 + MONTH(spent_on), COALESCE(category_ids, 0)
+        """,
+    ]),
+    (6, "Declare ON DELETE rules and add maintenance jobs", [
+        lambda cur: redeclare_expense_foreign_keys(cur),
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(32) NOT NULL,
+            target_id INT NOT NULL,
+            rows_done BIGINT NOT NULL DEFAULT 0,
+            finished BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_maintenance_jobs_pending (finished, id)
+        )
+        """,
+    ]),
+    (7, "Add user directory index", [
+        # Serves the admin user directory ordered by (role, fullname, id) and name prefix search
+        lambda cur: create_index_if_missing(cur, "users", "idx_users_role_name",
+                                            "CREATE INDEX idx_users_role_name ON users (role, fullname, id)"),
+    ]),
+]
+
+def create_index_if_missing(cur, table, name, create_sql):
+    # CREATE INDEX has no IF NOT EXISTS in MySQL, so look the name up first
+    cur.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table, name))
+    if cur.fetchone() is None:
+        cur.execute(create_sql)
+
+def redeclare_expense_foreign_keys(cur):
+    # The original constraints were unnamed, so look their generated names up first
+    cur.execute("""
+        SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'expenses' AND REFERENCED_TABLE_NAME IS NOT NULL
+    """)
+    for (name,) in cur.fetchall():
+        cur.execute(f"ALTER TABLE expenses DROP FOREIGN KEY `{name}`")
+    cur.execute("""
+        ALTER TABLE expenses
+            ADD CONSTRAINT fk_expenses_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            ADD CONSTRAINT fk_expenses_category FOREIGN KEY (category_ids) REFERENCES categories(category_id) ON DELETE SET NULL
+    """)
+
+# SQLite databases start from the schema MIGRATIONS had reached when the engine was
+# added, in one step numbered to match, and take later migrations from here
+SQLITE_MIGRATIONS = [
+    (7, "Create users, categories, expenses, rollups and maintenance tables", [
+        # NOCASE matches the case-insensitive MySQL collation for uniqueness and ordering
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fullname VARCHAR(50) NOT NULL COLLATE NOCASE,
+            username VARCHAR(50) UNIQUE NOT NULL COLLATE NOCASE,
+            email VARCHAR(100) UNIQUE NOT NULL COLLATE NOCASE,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(5) DEFAULT 'user' CHECK (role IN ('admin', 'user'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_name VARCHAR(50) UNIQUE NOT NULL COLLATE NOCASE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            amount DECIMAL(10,2) NOT NULL,
+            spent_on DATE NOT NULL,
+            note VARCHAR(255),
+            category_ids INTEGER REFERENCES categories(category_id) ON DELETE SET NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, spent_on, id)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_cat_date ON expenses (user_id, category_ids, spent_on, id, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_users_role_name ON users (role, fullname, id)",
+        # MySQL indexes every foreign key column implicitly; SQLite does not, and category
+        # deletes (and the ON DELETE SET NULL check) would scan the whole table without it
+        "CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category_ids)",
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO data_versions (name, version) VALUES ('categories', 1)",
+        """
+        CREATE TABLE IF NOT EXISTS expense_rollups (
+            user_id INTEGER NOT NULL,
+            ym INTEGER NOT NULL,
+            category_key INTEGER NOT NULL,
+            total DECIMAL(14,2) NOT NULL DEFAULT 0,
+            expense_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, ym, category_key)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind VARCHAR(32) NOT NULL,
+            target_id INTEGER NOT NULL,
+            rows_done BIGINT NOT NULL DEFAULT 0,
+            finished BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_jobs_pending ON maintenance_jobs (finished, id)",
+        # Stands in for MySQL's ON UPDATE CURRENT_TIMESTAMP
+        """
+        CREATE TRIGGER IF NOT EXISTS maintenance_jobs_updated_at AFTER UPDATE OF rows_done, finished ON maintenance_jobs
+        BEGIN
+            UPDATE maintenance_jobs SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+        """,
+    ]),
+]
+
+def current_schema_version(cur):
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cur.fetchone()[0]
+
+def run_migrations(conn, engine):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Serialize migrations between clients starting at the same time
+    engine.lock_migrations(cur)
+    try:
+        version = current_schema_version(cur)
+        for number, description, steps in engine.migrations:
+            if number <= version:
+                continue
+            print(f"Applying migration {number}: {description}", file=sys.stderr)
+            # MySQL commits DDL implicitly, so a migration is recorded only after all its steps succeed
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+            conn.commit()
+    finally:
+        engine.unlock_migrations(cur)
 
 # DATABASE INITIALIZATION
-def initialize_database():
+def initialize_database(verbose=True):
+    conn = None
+    try:
+        # Creates the database (or database file) if it does not exist yet
+        engine = storage_engine()
+        conn = engine.create_database()
+        
+        # Bring the schema up to the latest version
+        run_migrations(conn, engine)
+        if verbose:
+            print("Database and tables initialized successfully!")
+        
+    except Exception as e:
+        print(f"Error initializing database: {e}", file=sys.stderr)
+    finally:
+        if conn is not None:
+            conn.close()
+
+# DATABASE CONNECTION
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "expense"
+}
+
+# STORAGE ENGINES
+# "mysql" talks to a MySQL server with DB_CONFIG. "sqlite" keeps everything in one
+# local file, <database>.sqlite3 in SQLITE_DIR, for single-user installs that do not
+# want to run a server. Queries are written once in MySQL syntax; the SQLite engine
+# translates the few MySQL-only constructs as statements are executed
+DB_ENGINE = "mysql"
+SQLITE_DIR = os.path.dirname(os.path.abspath(__file__))
+SQLITE_BUSY_TIMEOUT = 10   # seconds a connection waits for another writer
+
+class MySQLEngine:
+    name = "mysql"
+    migrations = MIGRATIONS
+    supports_explain = True
+
+    def __init__(self, config):
+        self.config = dict(config)
+        import mysql.connector
+        from mysql.connector import errorcode
+        self.connector = mysql.connector
+        self.errorcode = errorcode
+
+    def connect(self):
+        return self.connector.connect(**self.config)
+
+    def create_database(self):
+        # Connect without database to check if it exists
+        server_config = {key: value for key, value in self.config.items() if key != "database"}
+        conn = self.connector.connect(**server_config)
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{self.config['database']}`")
+        cur.execute(f"USE `{self.config['database']}`")
+        return conn
+
+    def ensure_connected(self, conn):
+        # Returns True if the connection had dropped and was reopened
+        if conn.is_connected():
+            return False
+        conn.reconnect(attempts=2, delay=0)
+        return True
+
+    def lock_migrations(self, cur):
+        cur.execute("SELECT GET_LOCK('expense_schema_migrations', 30)")
+        if cur.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another client to finish migrating the schema")
+
+    def unlock_migrations(self, cur):
+        cur.execute("SELECT RELEASE_LOCK('expense_schema_migrations')")
+        cur.fetchone()
+
+    def duplicate_key(self, error):
+        # The unique key a duplicate-entry error names, or None for any other error.
+        # MySQL 8 reports "... for key 'users.email'", older servers "... for key 'email'"
+        if not isinstance(error, self.connector.IntegrityError) or error.errno != self.errorcode.ER_DUP_ENTRY:
+            return None
+        match = re.search(r"for key '(?:\w+\.)?(\w+)'", str(error.msg))
+        return match.group(1) if match else ""
+
+def note_rank(note, query):
+    # SQLite stand-in for MATCH(note) AGAINST (query IN BOOLEAN MODE) with the
+    # "+word*" queries note_search_terms builds: 0 unless every word starts a word
+    # of the note, otherwise the number of matching words as the relevance
+    if note is None or query is None:
+        return 0
+    note_words = re.findall(r"\w+", note.lower())
+    rank = 0
+    for term in query.split():
+        prefix = term.strip("+*").lower()
+        hits = sum(1 for word in note_words if word.startswith(prefix))
+        if not hits:
+            return 0
+        rank += hits
+    return rank
+
+# SQLite keeps DECIMAL columns with NUMERIC affinity, so amounts are stored as REAL.
+# Every DECIMAL(14,2) value survives that round trip through repr, but adding them
+# as floats does not, so money is summed and incremented as Decimal instead
+class DecimalSum:
+    def __init__(self):
+        self.total = None
+
+    def step(self, value):
+        if value is not None:
+            self.total = (self.total or Decimal(0)) + Decimal(str(value))
+
+    def finalize(self):
+        return None if self.total is None else str(self.total)
+
+def decimal_add(left, right):
+    if left is None or right is None:
+        return None
+    return str(Decimal(str(left)) + Decimal(str(right)))
+
+# (pattern, replacement) applied in order to every statement run on SQLite
+SQLITE_REWRITES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bSUM\(((?:\w+\.)?(?:amount|total))\)"), r"decimal_sum(\1)"),
+    (re.compile(r"\btotal = total \+ VALUES\(total\)"), "total = decimal_add(total, excluded.total)"),
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\bMATCH\(([\w.]+)\) AGAINST \(\? IN BOOLEAN MODE\)"), r"note_rank(\1, ?)"),
+    (re.compile(r"\bYEAR\(([\w.]+)\)"), r"CAST(substr(\1, 1, 4) AS INTEGER)"),
+    (re.compile(r"\bMONTH\(([\w.]+)\)"), r"CAST(substr(\1, 6, 2) AS INTEGER)"),
+    (re.compile(r"\bDIV\b"), "/"),
+    (re.compile(r"\bMOD\b"), "%"),
+    (re.compile(r"\bLIKE \?"), "LIKE ? ESCAPE '\\'"),
+    (re.compile(r"\s+FROM DUAL\b"), ""),
+    (re.compile(r"\s+FOR UPDATE\s*$"), ""),
+    (re.compile(r"^\s*DELETE FROM (\w+) WHERE (.*) LIMIT \?\s*$", re.S),
+     r"DELETE FROM \1 WHERE rowid IN (SELECT rowid FROM \1 WHERE \2 LIMIT ?)"),
+]
+SQLITE_WRITE_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|SAVEPOINT)\b|\bFOR UPDATE\s*$", re.I)
+
+def translate_sql_for_sqlite(sql):
+    for pattern, replacement in SQLITE_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+class SQLiteCursor:
+    # Translates each statement and opens write transactions with BEGIN IMMEDIATE,
+    # so a transaction that reads before it writes (SELECT ... FOR UPDATE) holds the
+    # write lock from the start instead of failing to upgrade later
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    def _begin(self, operation):
+        if not self._conn.in_transaction and SQLITE_WRITE_STATEMENT.search(operation):
+            self._cursor.execute("BEGIN IMMEDIATE")
+
+    def execute(self, operation, params=()):
+        self._begin(operation)
+        self._cursor.execute(translate_sql_for_sqlite(operation), params)
+        return self
+
+    def executemany(self, operation, seq_of_params):
+        self._begin(operation)
+        self._cursor.executemany(translate_sql_for_sqlite(operation), seq_of_params)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        # MySQL-only cursor options such as buffered=False are ignored; SQLite
+        # cursors already step through results without loading them all
+        if kwargs.get("dictionary"):
+            raise ValueError("Dictionary cursors are only available with the MySQL engine")
+        return SQLiteCursor(self._conn, self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class SQLiteEngine:
+    name = "sqlite"
+    migrations = SQLITE_MIGRATIONS
+    supports_explain = False
+
+    def __init__(self, config):
+        self.path = os.path.join(SQLITE_DIR, f"{config['database']}.sqlite3")
+        # ON CONFLICT DO UPDATE without a conflict target needs SQLite 3.35
+        if sqlite3.sqlite_version_info < (3, 35, 0):
+            raise RuntimeError(f"The sqlite engine needs SQLite 3.35 or newer, found {sqlite3.sqlite_version}")
+        # DATE and DECIMAL columns come back as date and Decimal, as they do from MySQL
+        sqlite3.register_adapter(Decimal, str)
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+        sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+        sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()).quantize(Decimal("0.01")))
+        sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+    def connect(self):
+        # Pooled connections are handed between worker threads, one borrower at a time
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.create_function("note_rank", 2, note_rank, deterministic=True)
+        conn.create_function("decimal_add", 2, decimal_add, deterministic=True)
+        conn.create_aggregate("decimal_sum", 1, DecimalSum)
+        return SQLiteConnection(conn)
+
+    def create_database(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return self.connect()
+
+    def ensure_connected(self, conn):
+        return False
+
+    def lock_migrations(self, cur):
+        # Each migration commits as one transaction; a local database file has a
+        # single application opening it, so there is no other client to wait for
+        pass
+
+    def unlock_migrations(self, cur):
+        pass
+
+    def duplicate_key(self, error):
+        # "UNIQUE constraint failed: users.email" names the column
+        if not isinstance(error, sqlite3.IntegrityError) or "UNIQUE constraint failed" not in str(error):
+            return None
+        match = re.search(r"UNIQUE constraint failed: \w+\.(\w+)", str(error))
+        return match.group(1) if match else ""
+
+STORAGE_ENGINES = {"mysql": MySQLEngine, "sqlite": SQLiteEngine}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def storage_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = STORAGE_ENGINES[DB_ENGINE](DB_CONFIG)
+        return _engine
+
+# INSTRUMENTATION
+SLOW_THRESHOLD_MS = 250   # anything slower is logged to stderr as it happens
+PROFILE_SAMPLES = 2000    # most recent timings kept per key for percentiles
+
+SQL_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+def normalize_sql(sql):
+    # One key per statement shape: whitespace collapsed and IN (...) lists folded
+    text = " ".join(str(sql).split())
+    return SQL_PLACEHOLDER_LIST.sub("%s, ...", text)[:200]
+
+class Profiler:
+    # Aggregates timings by (kind, name): SQL statements, result fetches,
+    # background tasks, screens and main-thread UI work
+    def __init__(self, slow_ms=SLOW_THRESHOLD_MS, samples=PROFILE_SAMPLES):
+        self.slow_ms = slow_ms
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, kind, name, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            stats = self._stats.get((kind, name))
+            if stats is None:
+                stats = self._stats[(kind, name)] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.samples)}
+            stats["count"] += 1
+            stats["total"] += ms
+            stats["max"] = max(stats["max"], ms)
+            stats["recent"].append(ms)
+        if ms >= self.slow_ms:
+            print(f"[slow {kind}] {ms:.1f} ms: {name}", file=sys.stderr)
+
+    @contextmanager
+    def timed(self, kind, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            items = [(key, dict(stats, recent=list(stats["recent"]))) for key, stats in self._stats.items()]
+        rows = []
+        for (kind, name), stats in items:
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "count": stats["count"],
+                "total_ms": round(stats["total"], 3),
+                "mean_ms": round(stats["total"] / stats["count"], 3),
+                "p50_ms": round(percentile(stats["recent"], 50), 3),
+                "p95_ms": round(percentile(stats["recent"], 95), 3),
+                "p99_ms": round(percentile(stats["recent"], 99), 3),
+                "max_ms": round(stats["max"], 3),
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def dump(self, path):
+        report = {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "slow_threshold_ms": self.slow_ms,
+            "pool": get_pool().stats() if _pool is not None else None,
+            "timings": self.summary(),
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+            f.write("\n")
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+profiler = Profiler()
+
+def profiled(kind):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.timed(kind, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class InstrumentedCursor:
+    # Times execute/executemany per statement and result fetching separately
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._sql = None
+
+    def execute(self, operation, *args, **kwargs):
+        self._sql = normalize_sql(operation)
+        with profiler.timed("sql", self._sql):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        self._sql = normalize_sql(operation)
+        with profiler.timed("sql", self._sql):
+            return self._cursor.executemany(operation, *args, **kwargs)
+
+    def fetchone(self):
+        with profiler.timed("fetch", self._sql):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with profiler.timed("fetch", self._sql):
+            return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with profiler.timed("fetch", self._sql):
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# CONNECTION POOL
+POOL_SIZE = 5             # maximum open connections
+POOL_TIMEOUT = 10         # seconds to wait for a free connection
+POOL_IDLE_TIMEOUT = 300   # idle connections older than this are closed
+POOL_PING_AFTER = 30      # idle connections older than this are health-checked before reuse
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    # Thin wrapper so existing `db.close()` calls hand the connection back to the pool
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ConnectionPool:
+    def __init__(self, engine, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, ping_after=POOL_PING_AFTER):
+        self.engine = engine
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._idle = []   # (connection, last_used), most recently used last
+        self._open = 0    # idle + borrowed
+        self._cond = threading.Condition()
+        self._stats = {
+            "hits": 0, "misses": 0, "waits": 0, "timeouts": 0,
+            "stale": 0, "evicted": 0, "wait_time": 0.0, "max_wait": 0.0
+        }
+
+    def _connect(self):
+        with profiler.timed("db", "connect"):
+            return self.engine.connect()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        # Caller holds the lock; oldest idle connections sit at the front
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._open -= 1
+            self._stats["evicted"] += 1
+            self._discard(conn)
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self._stats["waits"] += 1
+            self._stats["wait_time"] += waited
+            self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+            self._stats["hits" if conn is not None else "misses"] += 1
+        if waited > 0.001:
+            profiler.record("db", "pool wait", waited)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used > self.ping_after:
+                with profiler.timed("db", "ping"):
+                    reconnected = self.engine.ensure_connected(conn)
+                if reconnected:
+                    with self._cond:
+                        self._stats["stale"] += 1
+        except Exception:
+            if conn is not None:
+                self._discard(conn)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            # End any open transaction so the next borrower never sees a stale snapshot
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / requests if requests else 0.0
+        stats["avg_wait"] = stats["wait_time"] / requests if requests else 0.0
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(storage_engine())
+        return _pool
+
+def db_connection():
+    return get_pool().acquire()
+
+def report_pool_stats():
+    if _pool is None:
+        return
+    stats = _pool.stats()
+    print(f"Connection pool: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%} hit rate), {stats['waits']} waits, "
+          f"avg wait {stats['avg_wait'] * 1000:.1f} ms, max wait {stats['max_wait'] * 1000:.1f} ms, "
+          f"{stats['timeouts']} timeouts, {stats['stale']} stale reconnects, {stats['evicted']} evicted",
+          file=sys.stderr)
+    _pool.close_all()
+
+# DATA VERSIONS
+# Writers bump a named counter in the same transaction as their change, so any
+# client can tell whether its cached copy is current with a primary key lookup
+def bump_data_version(cur, name):
+    cur.execute("INSERT INTO data_versions (name, version) VALUES (%s, 1) ON DUPLICATE KEY UPDATE version = version + 1", (name,))
+    # The row stays locked until commit, so this is exactly the version this change produced
+    cur.execute("SELECT version FROM data_versions WHERE name=%s", (name,))
+    return cur.fetchone()[0]
+
+def expense_version_name(user_id):
+    return f"expenses:{user_id}"
+
+def get_data_version(name):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT version FROM data_versions WHERE name=%s", (name,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+    finally:
+        db.close()
+
+def get_data_versions(*names):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(f"SELECT name, version FROM data_versions WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+        found = dict(cur.fetchall())
+        return tuple(found.get(name, 0) for name in names)
+    finally:
+        db.close()
+
+# PASSWORD HASHING
+# Hashes are stored as "scheme$cost...$salt$hash" so every row carries its own salt
+# and cost. Rows still holding the original unsalted SHA-256 hex digest are verified
+# as legacy hashes and rewritten with PASSWORD_SCHEME on the next successful login,
+# as are rows hashed with older cost settings. Tune the costs with `expense.py hash-bench`
+PASSWORD_SCHEME = "scrypt"
+SCRYPT_N = 2 ** 14            # CPU/memory cost; memory used is 128 * N * r bytes
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+PASSWORD_SALT_BYTES = 16
+PASSWORD_HASH_BYTES = 32
+PASSWORD_CACHE_SIZE = 256     # verified logins remembered, see PasswordCache
+PASSWORD_HASH_TARGET_MS = 250
+
+class ScryptHasher:
+    name = "scrypt"
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n, self.r, self.p = n, r, p
+
+    def derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=PASSWORD_HASH_BYTES)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(PASSWORD_SALT_BYTES)
+        digest = self.derive(password, salt, self.n, self.r, self.p)
+        return f"{self.name}${self.n}${self.r}${self.p}${salt.hex()}${digest.hex()}"
+
+    def verify(self, password, encoded):
+        n, r, p, salt, digest = encoded.split("$")[1:]
+        return hmac.compare_digest(self.derive(password, bytes.fromhex(salt), int(n), int(r), int(p)).hex(), digest)
+
+    def needs_rehash(self, encoded):
+        return encoded.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+class Pbkdf2Hasher:
+    name = "pbkdf2_sha256"
+
+    def __init__(self, iterations=PBKDF2_ITERATIONS):
+        self.iterations = iterations
+
+    def derive(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=PASSWORD_HASH_BYTES)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(PASSWORD_SALT_BYTES)
+        digest = self.derive(password, salt, self.iterations)
+        return f"{self.name}${self.iterations}${salt.hex()}${digest.hex()}"
+
+    def verify(self, password, encoded):
+        iterations, salt, digest = encoded.split("$")[1:]
+        return hmac.compare_digest(self.derive(password, bytes.fromhex(salt), int(iterations)).hex(), digest)
+
+    def needs_rehash(self, encoded):
+        return encoded.split("$")[1] != str(self.iterations)
+
+class LegacySha256Hasher:
+    # Verify-only: the unsalted digests written before salted hashing existed
+    name = "sha256"
+
+    def hash(self, password):
+        raise ValueError("Unsalted SHA-256 is only accepted for verifying old passwords")
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), encoded)
+
+    def needs_rehash(self, encoded):
+        return True
+
+PASSWORD_HASHERS = {hasher.name: hasher for hasher in (ScryptHasher(), Pbkdf2Hasher(), LegacySha256Hasher())}
+
+def password_hasher(scheme=None):
+    scheme = scheme or PASSWORD_SCHEME
+    # hashlib.scrypt needs Python built against OpenSSL 1.1+
+    if scheme == "scrypt" and not hasattr(hashlib, "scrypt"):
+        scheme = "pbkdf2_sha256"
+    return PASSWORD_HASHERS[scheme]
+
+def hasher_for(encoded):
+    scheme = encoded.split("$", 1)[0] if "$" in encoded else "sha256"
+    hasher = PASSWORD_HASHERS.get(scheme)
+    if hasher is None:
+        raise ValueError(f"Unknown password hash scheme '{scheme}'")
+    return hasher
+
+def encrypt_password(password):
+    return password_hasher().hash(password)
+
+class PasswordCache:
+    # Remembers successful verifications so logging in again in the same process
+    # skips the deliberately slow hash. Entries are keyed by the stored hash, so a
+    # changed password never matches, and hold an HMAC of the password under a
+    # per-process random key rather than the password itself
+    def __init__(self, size=PASSWORD_CACHE_SIZE):
+        self.size = size
+        self._key = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def _tag(self, password):
+        return hmac.new(self._key, password.encode(), hashlib.sha256).digest()
+
+    def check(self, password, encoded):
+        with self._lock:
+            tag = self.entries.get(encoded)
+            if tag is None:
+                return False
+            self.entries.move_to_end(encoded)
+        return hmac.compare_digest(tag, self._tag(password))
+
+    def remember(self, password, encoded):
+        tag = self._tag(password)
+        with self._lock:
+            self.entries[encoded] = tag
+            self.entries.move_to_end(encoded)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+password_cache = PasswordCache()
+
+# Checked against when a username does not exist, so an unknown name costs the
+# same key derivation as a wrong password and login timing does not reveal it.
+# Made on first use, since hashing at import would slow down every process start
+@lru_cache(maxsize=None)
+def dummy_password_hash():
+    return encrypt_password(secrets.token_hex(16))
+
+def verify_password(password, encoded):
+    # Returns (matches, needs_rehash); runs on a worker thread since it is slow by design
+    hasher = hasher_for(encoded)
+    current = password_hasher()
+    needs_rehash = hasher is not current or current.needs_rehash(encoded)
+    if password_cache.check(password, encoded):
+        return True, needs_rehash
+    if not hasher.verify(password, encoded):
+        return False, False
+    password_cache.remember(password, encoded)
+    return True, needs_rehash
+
+def time_password_hash(hasher, repeat=3):
+    # Best of repeat runs, in milliseconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hasher.hash("benchmark-password")
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def calibrate_password_hashing(target_ms=PASSWORD_HASH_TARGET_MS, progress=None):
+    # Doubles each scheme's cost until one hash takes at least target_ms on this
+    # machine. Returns [(scheme, settings, milliseconds)] for the first cost that does.
+    # progress(scheme, settings, milliseconds) is called after every measurement
+    results = []
+    if hasattr(hashlib, "scrypt"):
+        n = 2 ** 12
+        while True:
+            elapsed = time_password_hash(ScryptHasher(n=n))
+            if progress:
+                progress("scrypt", {"SCRYPT_N": n}, elapsed)
+            if elapsed >= target_ms or n >= 2 ** 20:
+                results.append(("scrypt", {"SCRYPT_N": n, "SCRYPT_R": SCRYPT_R, "SCRYPT_P": SCRYPT_P}, elapsed))
+                break
+            n *= 2
+    iterations = 100000
+    while True:
+        elapsed = time_password_hash(Pbkdf2Hasher(iterations))
+        if progress:
+            progress("pbkdf2_sha256", {"PBKDF2_ITERATIONS": iterations}, elapsed)
+        if elapsed >= target_ms or iterations >= 10000000:
+            results.append(("pbkdf2_sha256", {"PBKDF2_ITERATIONS": iterations}, elapsed))
+            break
+        iterations *= 2
+    return results
+
+# INITIALIZE DATABASE WITH CATEGORIES
+def initialize_categories():
+    try:
+        db = db_connection()
+        cur = db.cursor()
+        categories_list = [
+            ('Food',), ('Groceries',), ('Dining Out',), ('Travel',), ('Transport',),
+            ('Fuel',), ('Accommodation',), ('Utilities',), ('Electricity',), ('Water',),
+            ('Internet',), ('Mobile',), ('Health',), ('Medical',), ('Pharmacy',),
+            ('Insurance',), ('Entertainment',), ('Movies',), ('Games',), ('Streaming',),
+            ('Shopping',), ('Clothing',), ('Electronics',), ('Education',), ('Books',),
+            ('Courses',), ('Fitness',), ('Gym',), ('Hobbies',), ('Gifts',),
+            ('Charity',), ('Miscellaneous',)
+        ]
+        cur.executemany("INSERT IGNORE INTO categories (category_name) VALUES (%s)", categories_list)
+        if cur.rowcount > 0:
+            bump_data_version(cur, "categories")
+        db.commit()
+    except Exception as e:
+        print(f"Error initializing categories: {e}", file=sys.stderr)
+    finally:
+        db.close()
+
+# EXPENSE FILTERS
+# One filter drives the table, the totals and the export. It compiles to a single
+# parameterized WHERE clause on the indexed columns, so only matching rows leave MySQL.
+# category_ids may include None for uncategorized expenses; an empty tuple means all
+ExpenseFilter = namedtuple("ExpenseFilter", ["category_ids", "date_from", "date_to", "min_amount", "max_amount", "note"],
+                           defaults=((), None, None, None, None, None))
+
+def make_expense_filter(category_ids=(), date_from=None, date_to=None, min_amount=None, max_amount=None, note=None):
+    # Validates raw values from the GUI or the command line; blank values mean no limit
+    def blank(value):
+        return value is None or str(value).strip() == ""
+
+    try:
+        date_from = None if blank(date_from) else parse_date(date_from)
+        date_to = None if blank(date_to) else parse_date(date_to)
+    except ValueError:
+        raise ValueError("Invalid date format in filter")
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("The start date is after the end date")
+    try:
+        min_amount = None if blank(min_amount) else parse_amount(min_amount)
+        max_amount = None if blank(max_amount) else parse_amount(max_amount)
+    except ValueError:
+        raise ValueError("Invalid amount in filter")
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise ValueError("The minimum amount is above the maximum amount")
+    note = None if blank(note) else str(note).strip()
+    if note and len(note) > MAX_NOTE_LENGTH:
+        raise ValueError(f"Search text longer than {MAX_NOTE_LENGTH} characters")
+    return ExpenseFilter(tuple(category_ids), date_from, date_to, min_amount, max_amount, note)
+
+def escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Note search goes through the FULLTEXT index: every word must match, and a word also
+# matches longer words it is the start of. Words shorter than FULLTEXT_MIN_WORD are not
+# in the index (innodb_ft_min_token_size), so those fall back to a LIKE on the rows
+# the indexed words and the other conditions have already narrowed down
+FULLTEXT_MIN_WORD = 3
+SEARCH_RESULT_LIMIT = 200
+
+def note_search_terms(text):
+    # Returns (boolean mode query or None, short words)
+    words = [word.lower() for word in re.findall(r"\w+", text or "")]
+    indexed = [word for word in words if len(word) >= FULLTEXT_MIN_WORD]
+    short = [word for word in words if len(word) < FULLTEXT_MIN_WORD]
+    query = " ".join(f"+{word}*" for word in indexed) if indexed else None
+    return query, short
+
+def note_matches(text, note):
+    # The same test in Python, for a single note
+    note = (note or "").lower()
+    note_words = re.findall(r"\w+", note)
+    for word in re.findall(r"\w+", (text or "").lower()):
+        if len(word) < FULLTEXT_MIN_WORD:
+            if word not in note:
+                return False
+        elif not any(note_word.startswith(word) for note_word in note_words):
+            return False
+    return True
+
+def build_expense_filter_conditions(expense_filter):
+    # Returns (conditions, params) to AND into a query on expenses aliased as e
+    conditions = []
+    params = []
+    if expense_filter is None:
+        return conditions, params
+    category_ids = [category_id for category_id in expense_filter.category_ids if category_id is not None]
+    category_conditions = []
+    if category_ids:
+        category_conditions.append(f"e.category_ids IN ({', '.join(['%s'] * len(category_ids))})")
+        params.extend(category_ids)
+    if None in expense_filter.category_ids:
+        category_conditions.append("e.category_ids IS NULL")
+    if len(category_conditions) > 1:
+        conditions.append(f"({' OR '.join(category_conditions)})")
+    else:
+        conditions.extend(category_conditions)
+    if expense_filter.date_from is not None:
+        conditions.append("e.spent_on >= %s")
+        params.append(expense_filter.date_from)
+    if expense_filter.date_to is not None:
+        conditions.append("e.spent_on <= %s")
+        params.append(expense_filter.date_to)
+    if expense_filter.min_amount is not None:
+        conditions.append("e.amount >= %s")
+        params.append(expense_filter.min_amount)
+    if expense_filter.max_amount is not None:
+        conditions.append("e.amount <= %s")
+        params.append(expense_filter.max_amount)
+    if expense_filter.note:
+        query, short = note_search_terms(expense_filter.note)
+        if query:
+            conditions.append("MATCH(e.note) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(query)
+        for word in short:
+            conditions.append("e.note LIKE %s")
+            params.append(f"%{escape_like(word)}%")
+    return conditions, params
+
+def expense_matches(expense_filter, record):
+    # The same test in Python, for rows changed locally after the table was filled
+    if expense_filter is None:
+        return True
+    if expense_filter.category_ids and record.category_id not in expense_filter.category_ids:
+        return False
+    if expense_filter.date_from is not None and record.spent_on < expense_filter.date_from:
+        return False
+    if expense_filter.date_to is not None and record.spent_on > expense_filter.date_to:
+        return False
+    if expense_filter.min_amount is not None and record.amount < expense_filter.min_amount:
+        return False
+    if expense_filter.max_amount is not None and record.amount > expense_filter.max_amount:
+        return False
+    if expense_filter.note and not note_matches(expense_filter.note, record.note):
+        return False
+    return True
+
+# EXPENSE QUERIES
+EXPENSE_PAGE_SIZE = 200
+# The expense table holds at most this many rows; pages far from the visible
+# part are dropped and fetched again by key when the user scrolls back to them
+EXPENSE_WINDOW_ROWS = 5 * EXPENSE_PAGE_SIZE
+
+def build_expense_page_query(user_id, expense_filter=None, after=None, limit=EXPENSE_PAGE_SIZE, before=None):
+    # Keyset pagination on (spent_on, id): each page is an index range scan that
+    # starts where the previous one ended, so deep pages cost the same as the first.
+    # With before, the page is the rows just newer than that key, scanned upwards
+    # (oldest first) so the ones nearest the key come back
+    conditions = ["e.user_id = %s"]
+    params = [user_id]
+    filter_conditions, filter_params = build_expense_filter_conditions(expense_filter)
+    conditions.extend(filter_conditions)
+    params.extend(filter_params)
+    if after is not None:
+        conditions.append("(e.spent_on < %s OR (e.spent_on = %s AND e.id < %s))")
+        params.extend([after[0], after[0], after[1]])
+    direction = "DESC"
+    if before is not None:
+        conditions.append("(e.spent_on > %s OR (e.spent_on = %s AND e.id > %s))")
+        params.extend([before[0], before[0], before[1]])
+        direction = "ASC"
+    sql = f"""
+        SELECT e.id, e.amount, e.spent_on, c.category_name, e.note
+        FROM expenses e
+        LEFT JOIN categories c ON e.category_ids = c.category_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY e.spent_on {direction}, e.id {direction}
+    """
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+def fetch_expense_page(user_id, expense_filter=None, after=None, limit=EXPENSE_PAGE_SIZE, before=None):
+    # Rows always come back newest first, whichever direction was scanned
+    sql, params = build_expense_page_query(user_id, expense_filter, after, limit, before)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    finally:
+        db.close()
+    if before is not None:
+        rows.reverse()
+    return rows
+
+def build_expense_search_query(user_id, expense_filter, limit=SEARCH_RESULT_LIMIT):
+    # Best matches first: full-text relevance, then newest. Only the top rows are
+    # returned, since a ranked list has no stable key to page on
+    conditions = ["e.user_id = %s"]
+    params = [user_id]
+    filter_conditions, filter_params = build_expense_filter_conditions(expense_filter)
+    conditions.extend(filter_conditions)
+    params.extend(filter_params)
+    query, short = note_search_terms(expense_filter.note)
+    order = "e.spent_on DESC, e.id DESC"
+    if query:
+        order = "MATCH(e.note) AGAINST (%s IN BOOLEAN MODE) DESC, " + order
+        params.append(query)
+    sql = f"""
+        SELECT e.id, e.amount, e.spent_on, c.category_name, e.note
+        FROM expenses e
+        LEFT JOIN categories c ON e.category_ids = c.category_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {order}
+        LIMIT %s
+    """
+    params.append(limit)
+    return sql, params
+
+def search_expenses(user_id, expense_filter, limit=SEARCH_RESULT_LIMIT):
+    sql, params = build_expense_search_query(user_id, expense_filter, limit)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        db.close()
+
+# EXPENSE SUMMARIES
+CENT = Decimal("0.01")
+
+# Dimension name -> (SELECT/GROUP BY expressions, needs categories join)
+SUMMARY_DIMENSIONS = {
+    "category": (["COALESCE(c.category_name, 'Uncategorized')"], True),
+    "year": (["YEAR(e.spent_on)"], False),
+    "month": (["YEAR(e.spent_on)", "MONTH(e.spent_on)"], False),
+}
+
+ExpenseSummary = namedtuple("ExpenseSummary", ["key", "count", "total", "smallest", "largest"])
+
+def to_decimal(value):
+    if value is None:
+        return Decimal("0.00")
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+def build_expense_summary_query(user_id, group_by=(), expense_filter=None):
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    expressions = []
+    join = False
+    for dimension in group_by:
+        if dimension not in SUMMARY_DIMENSIONS:
+            raise ValueError(f"Unknown summary dimension: {dimension}")
+        dimension_expressions, needs_join = SUMMARY_DIMENSIONS[dimension]
+        expressions.extend(dimension_expressions)
+        join = join or needs_join
+    conditions = ["e.user_id = %s"]
+    params = [user_id]
+    filter_conditions, filter_params = build_expense_filter_conditions(expense_filter)
+    conditions.extend(filter_conditions)
+    params.extend(filter_params)
+    select = ", ".join(expressions + ["COUNT(*)", "SUM(e.amount)", "MIN(e.amount)", "MAX(e.amount)"])
+    sql = f"SELECT {select} FROM expenses e"
+    if join:
+        sql += " LEFT JOIN categories c ON e.category_ids = c.category_id"
+    sql += f" WHERE {' AND '.join(conditions)}"
+    if expressions:
+        group = ", ".join(expressions)
+        sql += f" GROUP BY {group} ORDER BY {group}"
+    return sql, params, group_by
+
+def expense_summary(user_id, group_by=(), expense_filter=None, use_rollups=False):
+    # Aggregates run in MySQL on DECIMAL columns; values come back as exact Decimals.
+    # group_by is any combination of "category", "year" and "month"; each result key is
+    # a tuple with one entry per dimension (months as "YYYY-MM"), or None when ungrouped.
+    # With use_rollups the answer comes from expense_rollups whenever the filter allows
+    # it; smallest and largest are then None
+    query = build_rollup_summary_query(user_id, group_by, expense_filter) if use_rollups else None
+    sql, params, group_by = query or build_expense_summary_query(user_id, group_by, expense_filter)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    finally:
+        db.close()
+    results = []
+    for row in rows:
+        key = []
+        index = 0
+        for dimension in group_by:
+            if dimension == "month":
+                key.append(f"{int(row[index]):04d}-{int(row[index + 1]):02d}")
+                index += 2
+            elif dimension == "year":
+                key.append(int(row[index]))
+                index += 1
+            else:
+                key.append(row[index])
+                index += 1
+        count, total, smallest, largest = row[index:]
+        results.append(ExpenseSummary(
+            tuple(key) if group_by else None,
+            int(count),
+            to_decimal(total),
+            to_decimal(smallest) if smallest is not None else None,
+            to_decimal(largest) if largest is not None else None
+        ))
+    return results
+
+def expense_total(user_id, expense_filter=None):
+    return expense_summary(user_id, expense_filter=expense_filter, use_rollups=True)[0]
+
+# EXPENSE ROLLUPS
+# expense_rollups holds the total and count per (user, month, category). Every expense
+# write adjusts it in the same transaction, so summaries read months x categories
+# rows instead of every expense. Uncategorized expenses use category_key 0
+ROLLUP_DIMENSIONS = {
+    "category": (["COALESCE(c.category_name, 'Uncategorized')"], True),
+    "year": (["r.ym DIV 100"], False),
+    "month": (["r.ym DIV 100", "r.ym MOD 100"], False),
+}
+
+ROLLUP_SOURCE_SQL = """
+    SELECT user_id, YEAR(spent_on) * 100 + MONTH(spent_on), COALESCE(category_ids, 0), SUM(amount), COUNT(*)
+    FROM expenses {where}
+    GROUP BY user_id, YEAR(spent_on) * 100 + MONTH(spent_on), COALESCE(category_ids, 0)
+"""
+
+def rollup_month(spent_on):
+    return spent_on.year * 100 + spent_on.month
+
+def rollup_key(category_id):
+    return 0 if category_id is None else category_id
+
+def build_rollup_filter_conditions(expense_filter):
+    # Returns (conditions, params) on expense_rollups aliased as r, or None when the
+    # filter needs individual rows: amounts, note search, or dates inside a month
+    conditions = []
+    params = []
+    if expense_filter is None:
+        return conditions, params
+    if expense_filter.min_amount is not None or expense_filter.max_amount is not None or expense_filter.note:
+        return None
+    if expense_filter.category_ids:
+        conditions.append(f"r.category_key IN ({', '.join(['%s'] * len(expense_filter.category_ids))})")
+        params.extend(rollup_key(category_id) for category_id in expense_filter.category_ids)
+    if expense_filter.date_from is not None:
+        if expense_filter.date_from.day != 1:
+            return None
+        conditions.append("r.ym >= %s")
+        params.append(rollup_month(expense_filter.date_from))
+    if expense_filter.date_to is not None:
+        if (expense_filter.date_to + timedelta(days=1)).day != 1:
+            return None
+        conditions.append("r.ym <= %s")
+        params.append(rollup_month(expense_filter.date_to))
+    return conditions, params
+
+def build_rollup_summary_query(user_id, group_by=(), expense_filter=None):
+    # Same result columns as build_expense_summary_query, or None if the filter rules rollups out
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    filter_query = build_rollup_filter_conditions(expense_filter)
+    if filter_query is None:
+        return None
+    expressions = []
+    join = False
+    for dimension in group_by:
+        if dimension not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"Unknown summary dimension: {dimension}")
+        dimension_expressions, needs_join = ROLLUP_DIMENSIONS[dimension]
+        expressions.extend(dimension_expressions)
+        join = join or needs_join
+    conditions = ["r.user_id = %s"] + filter_query[0]
+    params = [user_id] + filter_query[1]
+    select = ", ".join(expressions + ["COALESCE(SUM(r.expense_count), 0)", "SUM(r.total)", "NULL", "NULL"])
+    sql = f"SELECT {select} FROM expense_rollups r"
+    if join:
+        sql += " LEFT JOIN categories c ON r.category_key = c.category_id"
+    sql += f" WHERE {' AND '.join(conditions)}"
+    if expressions:
+        group = ", ".join(expressions)
+        sql += f" GROUP BY {group} ORDER BY {group}"
+    return sql, params, group_by
+
+def adjust_rollups(cur, user_id, changes):
+    # changes are (spent_on, category_id, amount, count) with negative amount and count for removals
+    deltas = {}
+    for spent_on, category_id, amount, count in changes:
+        key = (rollup_month(spent_on), rollup_key(category_id))
+        total, expense_count = deltas.get(key, (Decimal("0.00"), 0))
+        deltas[key] = (total + amount, expense_count + count)
+    rows = [(user_id, ym, category_key, total, count)
+            for (ym, category_key), (total, count) in deltas.items() if total or count]
+    if not rows:
+        return
+    cur.executemany("""
+        INSERT INTO expense_rollups (user_id, ym, category_key, total, expense_count) VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total), expense_count = expense_count + VALUES(expense_count)
+    """, rows)
+    emptied = [(user_id, ym, category_key) for user_id, ym, category_key, total, count in rows if count < 0]
+    if emptied:
+        cur.executemany("DELETE FROM expense_rollups WHERE user_id=%s AND ym=%s AND category_key=%s AND expense_count <= 0", emptied)
+
+def rebuild_rollups(cur, user_id=None):
+    where, params = ("WHERE user_id = %s", (user_id,)) if user_id is not None else ("", ())
+    cur.execute(f"DELETE FROM expense_rollups {where}", params)
+    cur.execute("INSERT INTO expense_rollups (user_id, ym, category_key, total, expense_count) "
+                + ROLLUP_SOURCE_SQL.format(where=where), params)
+    return cur.rowcount
+
+def rebuild_expense_rollups(user_id=None):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        groups = rebuild_rollups(cur, user_id)
+        db.commit()
+        return groups
+    finally:
+        db.close()
+
+def verify_expense_rollups(user_id=None):
+    # Recomputes the rollups from expenses. Returns (mismatches, groups checked); each
+    # mismatch is (key, expected, stored) with key (user_id, ym, category_key) and
+    # values (total, count), or None where one side has no row
+    where, params = ("WHERE user_id = %s", (user_id,)) if user_id is not None else ("", ())
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(ROLLUP_SOURCE_SQL.format(where=where), params)
+        expected = {(row[0], int(row[1]), int(row[2])): (to_decimal(row[3]), int(row[4])) for row in cur.fetchall()}
+        cur.execute(f"SELECT user_id, ym, category_key, total, expense_count FROM expense_rollups {where}", params)
+        stored = {(row[0], row[1], row[2]): (to_decimal(row[3]), row[4]) for row in cur.fetchall() if row[3] or row[4]}
+    finally:
+        db.close()
+    return [(key, expected.get(key), stored.get(key)) for key in sorted(set(expected) | set(stored))
+            if expected.get(key) != stored.get(key)], len(expected)
+
+# USER ACCOUNTS
+def admin_exists():
+    try:
+        db = db_connection()
+        cur = db.cursor()
+        cur.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
+        count = cur.fetchone()[0]
+        return count > 0
+    except:
+        return False
+    finally:
+        db.close()
+
+def authenticate(username, password, role):
+    # The hash is checked here rather than in SQL since each row has its own salt
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT id, fullname, username, email, role, password FROM users WHERE username=%s", (username,))
+        row = cur.fetchone()
+        if not row:
+            password_hasher().verify(password, dummy_password_hash())
+            return None
+        user = SessionUser(*row[:5])
+        user_id, encoded = user.id, row[5]
+        matches, needs_rehash = verify_password(password, encoded)
+        if not matches or user.role != role:
+            return None
+        if needs_rehash:
+            # Only replaces the hash that was verified, in case it changed meanwhile
+            cur.execute("UPDATE users SET password=%s WHERE id=%s AND password=%s",
+                        (encrypt_password(password), user_id, encoded))
+            db.commit()
+        return user
+    finally:
+        db.close()
+
+def find_user(username):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT id, fullname, role FROM users WHERE username=%s", (username,))
+        return cur.fetchone()
+    finally:
+        db.close()
+
+# The UNIQUE keys on users do the duplicate checks, so each write is a single
+# atomic statement. A duplicate-key error is mapped back to the field it names
+USER_UNIQUE_KEYS = {
+    "username": "Username already exists",
+    "email": "Email already exists",
+}
+
+def duplicate_user_error(error):
+    # A ValueError naming the taken field, or None if error is not a duplicate key
+    key = storage_engine().duplicate_key(error)
+    if key is None:
+        return None
+    return ValueError(USER_UNIQUE_KEYS.get(key, "Username or email already exists"))
+
+def insert_user(cur, fullname, username, email, encrypted, role, first_admin=False):
+    # first_admin only inserts while no admin exists, checked in the same statement
+    try:
+        if first_admin:
+            cur.execute("""
+                INSERT INTO users (fullname, username, email, password, role)
+                SELECT %s, %s, %s, %s, 'admin' FROM DUAL
+                WHERE NOT EXISTS (SELECT 1 FROM users WHERE role='admin')
+            """, (fullname, username, email, encrypted))
+            if cur.rowcount == 0:
+                return None
+        else:
+            cur.execute("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)",
+                        (fullname, username, email, encrypted, role))
+    except Exception as e:
+        duplicate = duplicate_user_error(e)
+        if duplicate is None:
+            raise
+        raise duplicate
+    return cur.lastrowid
+
+def create_user_account(fullname, username, email, password, role, first_admin=False):
+    encrypted = encrypt_password(password)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        new_id = insert_user(cur, fullname, username, email, encrypted, role, first_admin)
+        if new_id is None:
+            return None
+        bump_data_version(cur, "users")
+        db.commit()
+        return new_id
+    finally:
+        db.close()
+
+def update_user_account(user_id, fullname, username, email, password=None):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        try:
+            if password:
+                cur.execute("UPDATE users SET fullname=%s, username=%s, email=%s, password=%s WHERE id=%s", 
+                           (fullname, username, email, encrypt_password(password), user_id))
+            else:
+                cur.execute("UPDATE users SET fullname=%s, username=%s, email=%s WHERE id=%s", 
+                           (fullname, username, email, user_id))
+        except Exception as e:
+            duplicate = duplicate_user_error(e)
+            if duplicate is None:
+                raise
+            raise duplicate
+        bump_data_version(cur, "users")
+        db.commit()
+    finally:
+        db.close()
+
+# USER DIRECTORY
+# The admin user list is paged on (role, fullname, id) like the expense list. A search
+# is the union of three prefix lookups - username and email on their UNIQUE indexes,
+# full name on idx_users_role_name - so it never scans the whole users table
+USER_PAGE_SIZE = 200
+USER_ROLES = ("admin", "user")
+
+def build_user_page_query(search=None, after=None, limit=USER_PAGE_SIZE):
+    keyset = ""
+    keyset_params = []
+    if after is not None:
+        role, fullname, user_id = after
+        keyset = " AND (role > %s OR (role = %s AND (fullname > %s OR (fullname = %s AND id > %s))))"
+        keyset_params = [role, role, fullname, fullname, user_id]
+    columns = "id, fullname, username, email, role"
+    order = "ORDER BY role, fullname, id LIMIT %s"
+    search = (search or "").strip()
+    if not search:
+        sql = f"SELECT {columns} FROM users WHERE role IN (%s, %s){keyset} {order}"
+        return sql, list(USER_ROLES) + keyset_params + [limit]
+    prefix = escape_like(search) + "%"
+    branches = [
+        ("username LIKE %s", [prefix]),
+        ("email LIKE %s", [prefix]),
+        ("role IN (%s, %s) AND fullname LIKE %s", list(USER_ROLES) + [prefix]),
+    ]
+    # Each branch is wrapped as a derived table, the form both MySQL and SQLite
+    # accept for a LIMIT inside a UNION
+    parts = []
+    params = []
+    for number, (condition, condition_params) in enumerate(branches):
+        parts.append(f"SELECT {columns} FROM (SELECT {columns} FROM users WHERE {condition}{keyset} {order}) branch{number}")
+        params.extend(condition_params + keyset_params + [limit])
+    sql = f"SELECT {columns} FROM ({' UNION '.join(parts)}) matches {order}"
+    return sql, params + [limit]
+
+def fetch_user_page(search=None, after=None, limit=USER_PAGE_SIZE):
+    sql, params = build_user_page_query(search, after, limit)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        db.close()
+
+def user_matches(search, row):
+    # Mirrors build_user_page_query for rows patched into a searched list
+    search = (search or "").strip().lower()
+    if not search:
+        return True
+    user_id, fullname, username, email, role = row
+    return (username.lower().startswith(search) or email.lower().startswith(search)
+            or (role in USER_ROLES and fullname.lower().startswith(search)))
+
+def fetch_user(user_id):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT id, fullname, username, email, role FROM users WHERE id=%s", (user_id,))
+        return cur.fetchone()
+    finally:
+        db.close()
+
+def remove_user(user_id, progress=None):
+    return run_maintenance_job(start_maintenance_job("delete_user", user_id), progress)
+
+# CATEGORY QUERIES
+def fetch_categories():
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
+        return cur.fetchall()
+    finally:
+        db.close()
+
+def insert_category(category_name):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT category_id FROM categories WHERE category_name=%s", (category_name,))
+        if cur.fetchone():
+            raise ValueError("Category already exists")
+        cur.execute("INSERT INTO categories (category_name) VALUES (%s)", (category_name,))
+        category_id = cur.lastrowid
+        bump_data_version(cur, "categories")
+        db.commit()
+        category_cache.invalidate()
+        return category_id
+    finally:
+        db.close()
+
+def remove_category(category_id, progress=None):
+    try:
+        return run_maintenance_job(start_maintenance_job("delete_category", category_id), progress)
+    finally:
+        category_cache.invalidate()
+
+# MAINTENANCE JOBS
+# Deleting a user or a category touches every one of their expenses, so the work is
+# done MAINTENANCE_CHUNK_SIZE rows per transaction instead of in one huge statement
+# that holds locks and grows the undo log. Progress is recorded in maintenance_jobs
+# with each chunk, so an interrupted job is picked up again where it stopped. The
+# final chunk removes the user or category itself; the ON DELETE rules on expenses
+# only catch rows written after that chunk was read
+MAINTENANCE_CHUNK_SIZE = 10000
+
+MaintenanceJob = namedtuple("MaintenanceJob", ["id", "kind", "target_id", "rows_done"])
+
+def start_maintenance_job(kind, target_id):
+    # Reuses an unfinished job for the same target, so a repeated request resumes it
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT id, kind, target_id, rows_done FROM maintenance_jobs WHERE finished = FALSE AND kind=%s AND target_id=%s",
+                    (kind, target_id))
+        row = cur.fetchone()
+        if row:
+            return MaintenanceJob(*row)
+        cur.execute("INSERT INTO maintenance_jobs (kind, target_id) VALUES (%s, %s)", (kind, target_id))
+        db.commit()
+        return MaintenanceJob(cur.lastrowid, kind, target_id, 0)
+    finally:
+        db.close()
+
+def pending_maintenance_jobs():
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT id, kind, target_id, rows_done FROM maintenance_jobs WHERE finished = FALSE ORDER BY id")
+        return [MaintenanceJob(*row) for row in cur.fetchall()]
+    finally:
+        db.close()
+
+def delete_user_chunk(cur, user_id):
+    # Deletes one chunk of the user's expenses and adjusts their rollups in the same
+    # transaction, so a job stopped between chunks leaves the totals exact
+    cur.execute("SELECT id, amount, spent_on, category_ids FROM expenses WHERE user_id=%s ORDER BY id LIMIT %s FOR UPDATE",
+                (user_id, MAINTENANCE_CHUNK_SIZE))
+    rows = cur.fetchall()
+    for batch in id_batches(row[0] for row in rows):
+        cur.execute(f"DELETE FROM expenses WHERE id IN ({', '.join(['%s'] * len(batch))})", batch)
+    if rows:
+        adjust_rollups(cur, user_id, [(spent_on, category_id, -amount, -1) for _, amount, spent_on, category_id in rows])
+        bump_data_version(cur, expense_version_name(user_id))
+    if len(rows) < MAINTENANCE_CHUNK_SIZE:
+        cur.execute("DELETE FROM expense_rollups WHERE user_id=%s", (user_id,))
+        cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        bump_data_version(cur, "users")
+    return len(rows)
+
+def delete_category_chunk(cur, category_id):
+    # Moves one chunk of the category's expenses to uncategorized, keeping each user's rollups exact
+    cur.execute("SELECT id, user_id, amount, spent_on FROM expenses WHERE category_ids=%s ORDER BY id LIMIT %s FOR UPDATE",
+                (category_id, MAINTENANCE_CHUNK_SIZE))
+    rows = cur.fetchall()
+    for batch in id_batches(row[0] for row in rows):
+        cur.execute(f"UPDATE expenses SET category_ids=NULL WHERE id IN ({', '.join(['%s'] * len(batch))})", batch)
+    by_user = {}
+    for expense_id, user_id, amount, spent_on in rows:
+        by_user.setdefault(user_id, []).extend([(spent_on, category_id, -amount, -1), (spent_on, None, amount, 1)])
+    for user_id, changes in by_user.items():
+        adjust_rollups(cur, user_id, changes)
+        bump_data_version(cur, expense_version_name(user_id))
+    if len(rows) < MAINTENANCE_CHUNK_SIZE:
+        cur.execute("DELETE FROM categories WHERE category_id=%s", (category_id,))
+        bump_data_version(cur, "categories")
+    return len(rows)
+
+MAINTENANCE_STEPS = {
+    "delete_user": delete_user_chunk,
+    "delete_category": delete_category_chunk,
+}
+
+def run_maintenance_job(job, progress=None):
+    # progress(rows_done) is called after every committed chunk; raising from it
+    # (e.g. TaskCancelled) stops the job between chunks, ready to be resumed
+    step = MAINTENANCE_STEPS[job.kind]
+    rows_done = job.rows_done
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        while True:
+            rows = step(cur, job.target_id)
+            rows_done += rows
+            finished = rows < MAINTENANCE_CHUNK_SIZE
+            cur.execute("UPDATE maintenance_jobs SET rows_done=%s, finished=%s WHERE id=%s", (rows_done, finished, job.id))
+            db.commit()
+            if progress:
+                progress(rows_done)
+            if finished:
+                return rows_done
+    finally:
+        db.close()
+
+def resume_maintenance_jobs(progress=None):
+    # progress(job, rows_done); returns the jobs that were completed
+    jobs = pending_maintenance_jobs()
+    for job in jobs:
+        run_maintenance_job(job, (lambda rows_done, job=job: progress(job, rows_done)) if progress else None)
+        if job.kind == "delete_category":
+            category_cache.invalidate()
+    return jobs
+
+# CATEGORY CACHE
+CATEGORY_CHECK_INTERVAL = 5   # seconds between version stamp checks
+
+class CategoryCache:
+    # name -> id and id -> name maps shared by every screen. The full list is
+    # re-read only when the categories version stamp in the database moves,
+    # and the stamp itself is checked at most every CATEGORY_CHECK_INTERVAL seconds
+    def __init__(self, check_interval=CATEGORY_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        self.rows = []
+        self.by_name = {}
+        self.by_id = {}
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    def load(self):
+        # Runs on a worker thread; returns the (category_id, category_name) rows ordered by name
+        with self._lock:
+            if self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+                return self.rows
+            known_version = self.version
+        # Read the stamp before the rows so a concurrent change is never recorded as seen
+        version = get_data_version("categories")
+        if version != known_version:
+            rows = fetch_categories()
+            with self._lock:
+                self.rows = rows
+                self.by_name = {name: category_id for category_id, name in rows}
+                self.by_id = {category_id: name for category_id, name in rows}
+                self.version = version
+        with self._lock:
+            self.checked_at = time.monotonic()
+            return self.rows
+
+    def names(self):
+        return [name for _, name in self.rows]
+
+    def id_for(self, name):
+        return self.by_name.get(name)
+
+    def name_for(self, category_id):
+        return self.by_id.get(category_id)
+
+category_cache = CategoryCache()
+
+# REPORTS
+# The Reports tab charts spending by category and by month from the rollups. Each
+# report is cached per user, range and the dates the range covers, with the data
+# versions it was read at, so opening the tab again costs one version lookup unless
+# the data changed
+REPORT_RANGES = ("Last 12 months", "This year", "Last year", "All time")
+REPORT_CACHE_SIZE = 32
+
+ExpenseReport = namedtuple("ExpenseReport", ["versions", "by_category", "by_month", "dates"])
+
+def report_range(name, today=None):
+    # Whole months only, so the summaries can be answered from the rollups
+    today = today or date.today()
+    if name == "This year":
+        return date(today.year, 1, 1), date(today.year, 12, 31)
+    if name == "Last year":
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    if name == "Last 12 months":
+        first = today.year * 12 + today.month - 12
+        next_month = today.year * 12 + today.month
+        return date(first // 12, first % 12 + 1, 1), date(next_month // 12, next_month % 12 + 1, 1) - timedelta(days=1)
+    return None, None
+
+def month_span(first, last):
+    # "YYYY-MM" labels from first to last inclusive
+    year, month = map(int, first.split("-"))
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+class ReportCache:
+    def __init__(self, size=REPORT_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self.reports = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self.reports.clear()
+
+    def load(self, user_id, range_name):
+        # Runs on a worker thread. by_category is (name, total) largest first; by_month is
+        # ("YYYY-MM", total) for every month in the range, including months without spending
+        # The dates are part of the key, so "this year" read last December is not
+        # reused in January when the versions have not moved
+        date_from, date_to = report_range(range_name)
+        key = (user_id, range_name, date_from, date_to)
+        # Read the stamps before the data so a concurrent change is never recorded as seen
+        versions = get_data_versions(expense_version_name(user_id), "categories")
+        with self._lock:
+            report = self.reports.get(key)
+            if report is not None and report.versions == versions:
+                self.reports.move_to_end(key)
+                return report
+        expense_filter = ExpenseFilter(date_from=date_from, date_to=date_to)
+        by_category = [(row.key[0], row.total) for row in expense_summary(user_id, "category", expense_filter, use_rollups=True)]
+        by_category.sort(key=lambda item: item[1], reverse=True)
+        months = {row.key[0]: row.total for row in expense_summary(user_id, "month", expense_filter, use_rollups=True)}
+        first = date_from.strftime("%Y-%m") if date_from else min(months, default=None)
+        last = date_to.strftime("%Y-%m") if date_to else max(months, default=None)
+        by_month = [(month, months.get(month, Decimal("0.00"))) for month in month_span(first, last)] if first else []
+        report = ExpenseReport(versions, by_category, by_month, (date_from, date_to))
+        with self._lock:
+            self.reports[key] = report
+            self.reports.move_to_end(key)
+            while len(self.reports) > self.size:
+                self.reports.popitem(last=False)
+        return report
+
+# SESSIONS
+# A Session lives from login to logout and holds what the signed-in user's screens
+# share: the user record, the category map, their report cache and short-lived query
+# results. Screens are handed the session instead of loose ids and names, and logout
+# closes it so nothing cached for one user is left for the next
+SESSION_CACHE_TTL = 2   # seconds a cached query result is reused
+
+SessionUser = namedtuple("SessionUser", ["id", "fullname", "username", "email", "role"])
+
+class Session:
+    def __init__(self, user):
+        self.user = user
+        self.categories = category_cache
+        self.reports = ReportCache()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._results = {}
+
+    def cached(self, key, loader, ttl=SESSION_CACHE_TTL):
+        # Runs on a worker thread; loader() runs again once the stored result is ttl seconds old
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+        value = loader()
+        with self._lock:
+            if not self.closed:
+                self._results[key] = (time.monotonic(), value)
+        return value
+
+    def data_version(self, name):
+        # Version stamps only grow, so a slightly old one is still safe to compare
+        # with "newer than what is shown"; screens switching back and forth reuse it
+        return self.cached(("version", name), lambda: get_data_version(name))
+
+    def expense_version(self):
+        return self.data_version(expense_version_name(self.user.id))
+
+    def load_report(self, range_name, seen_versions=(None, None)):
+        # Switching back to the tab within the TTL reuses the report without even the
+        # version lookup, unless the screens have already shown newer data than it was
+        # read at. seen_versions are the (expenses, categories) stamps on display
+        def load():
+            return self.reports.load(self.user.id, range_name)
+
+        key = ("report", range_name, report_range(range_name))
+        report = self.cached(key, load)
+        if any(seen is not None and seen > read for seen, read in zip(seen_versions, report.versions)):
+            report = self.cached(key, load, ttl=0)
+        return report
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._results.clear()
+        self.reports.clear()
+
+current_session = None
+
+def start_session(user):
+    global current_session
+    if current_session is not None:
+        current_session.close()
+    current_session = Session(user)
+    return current_session
+
+def close_session():
+    global current_session
+    if current_session is not None:
+        current_session.close()
+    current_session = None
+
+# EXPENSE VALIDATION
+# Shared by the add/update forms and the importer so every path accepts the same values
+MAX_AMOUNT = Decimal("99999999.99")   # DECIMAL(10,2)
+MAX_NOTE_LENGTH = 255
+
+def parse_amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except Exception:
+        raise ValueError("Invalid amount")
+    if not amount.is_finite():
+        raise ValueError("Invalid amount")
+    # Round to cents the way MySQL stores DECIMAL(10,2)
+    amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    if amount <= 0 or amount > MAX_AMOUNT:
+        raise ValueError("Invalid amount")
+    return amount
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value).strip(), "%Y-%m-%d").date()
+    except Exception:
+        raise ValueError("Invalid date format")
+
+# EXPENSE WRITES
+# Single-row writes return the row before and after the change together with the
+# new expenses version, so a screen can patch one table row instead of reloading
+ExpenseRecord = namedtuple("ExpenseRecord", "id amount spent_on category_id note")
+ExpenseChange = namedtuple("ExpenseChange", "expense_id before after version")
+
+def lock_expense_record(cur, user_id, expense_id):
+    cur.execute("SELECT id, amount, spent_on, category_ids, note FROM expenses WHERE id=%s AND user_id=%s FOR UPDATE",
+               (expense_id, user_id))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError("Expense not found")
+    return ExpenseRecord(*row)
+
+def insert_expense(user_id, amount, spent_on, note, category_id):
+    spent_on = parse_date(spent_on)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("INSERT INTO expenses (user_id, amount, spent_on, note, category_ids) VALUES (%s, %s, %s, %s, %s)",
+                   (user_id, amount, spent_on, note, category_id))
+        after = ExpenseRecord(cur.lastrowid, amount, spent_on, category_id, note)
+        adjust_rollups(cur, user_id, [(spent_on, category_id, amount, 1)])
+        version = bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return ExpenseChange(after.id, None, after, version)
+    finally:
+        db.close()
+
+def modify_expense(user_id, expense_id, amount, spent_on, note, category_id):
+    spent_on = parse_date(spent_on)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        before = lock_expense_record(cur, user_id, expense_id)
+        cur.execute("UPDATE expenses SET amount=%s, spent_on=%s, note=%s, category_ids=%s WHERE id=%s AND user_id=%s",
+                   (amount, spent_on, note, category_id, expense_id, user_id))
+        after = ExpenseRecord(before.id, amount, spent_on, category_id, note)
+        adjust_rollups(cur, user_id, [(before.spent_on, before.category_id, -before.amount, -1),
+                                      (spent_on, category_id, amount, 1)])
+        version = bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return ExpenseChange(before.id, before, after, version)
+    finally:
+        db.close()
+
+def remove_expense(user_id, expense_id):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        before = lock_expense_record(cur, user_id, expense_id)
+        cur.execute("DELETE FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
+        adjust_rollups(cur, user_id, [(before.spent_on, before.category_id, -before.amount, -1)])
+        version = bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return ExpenseChange(before.id, before, None, version)
+    finally:
+        db.close()
+
+# BULK EXPENSE WRITES
+# Bulk actions change the selected rows with batched IN lists inside a single
+# transaction and return one ExpenseChange per affected row, all with the same version
+BULK_BATCH_SIZE = 1000
+
+def id_batches(ids):
+    ids = list(ids)
+    return [ids[start:start + BULK_BATCH_SIZE] for start in range(0, len(ids), BULK_BATCH_SIZE)]
+
+def lock_expense_records(cur, user_id, expense_ids):
+    records = []
+    for batch in id_batches(expense_ids):
+        cur.execute(f"SELECT id, amount, spent_on, category_ids, note FROM expenses WHERE user_id=%s AND id IN ({', '.join(['%s'] * len(batch))}) FOR UPDATE",
+                    [user_id] + batch)
+        records.extend(ExpenseRecord(*row) for row in cur.fetchall())
+    return records
+
+def remove_expenses(user_id, expense_ids):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        before = lock_expense_records(cur, user_id, expense_ids)
+        if not before:
+            return []
+        for batch in id_batches(record.id for record in before):
+            cur.execute(f"DELETE FROM expenses WHERE user_id=%s AND id IN ({', '.join(['%s'] * len(batch))})", [user_id] + batch)
+        adjust_rollups(cur, user_id, [(record.spent_on, record.category_id, -record.amount, -1) for record in before])
+        version = bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return [ExpenseChange(record.id, record, None, version) for record in before]
+    finally:
+        db.close()
+
+def recategorize_expenses(user_id, expense_ids, category_id):
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        before = [record for record in lock_expense_records(cur, user_id, expense_ids) if record.category_id != category_id]
+        if not before:
+            return []
+        for batch in id_batches(record.id for record in before):
+            cur.execute(f"UPDATE expenses SET category_ids=%s WHERE user_id=%s AND id IN ({', '.join(['%s'] * len(batch))})",
+                        [category_id, user_id] + batch)
+        adjust_rollups(cur, user_id, [(record.spent_on, record.category_id, -record.amount, -1) for record in before]
+                                     + [(record.spent_on, category_id, record.amount, 1) for record in before])
+        version = bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return [ExpenseChange(record.id, record, record._replace(category_id=category_id), version) for record in before]
+    finally:
+        db.close()
+
+# EXPENSE IMPORT
+IMPORT_BATCH_SIZE = 1000       # rows per executemany (one multi-row INSERT)
+IMPORT_COMMIT_ROWS = 20000     # rows per transaction
+MAX_IMPORT_ERRORS = 1000       # row errors kept for the report; all are counted
+
+# cancelled is True when progress raised TaskCancelled; the rows imported until then are kept
+ImportResult = namedtuple("ImportResult", ["imported", "error_count", "errors", "elapsed", "cancelled"], defaults=(False,))
+
+IMPORT_COLUMNS = {
+    "amount": "amount",
+    "date": "date",
+    "spent_on": "date",
+    "category": "category",
+    "category_name": "category",
+    "note": "note",
+}
+
+USER_IMPORT_COLUMNS = {
+    "fullname": "fullname",
+    "full name": "fullname",
+    "name": "fullname",
+    "username": "username",
+    "email": "email",
+    "password": "password",
+    "role": "role",
+}
+
+# Column widths from the users table, checked before a row reaches the database
+USER_FIELD_LENGTHS = {"fullname": 50, "username": 50, "email": 100}
+
+def import_columns(header, aliases):
+    # Maps each field to the index of the first header cell naming it
+    columns = {}
+    for index, name in enumerate(header):
+        field = aliases.get(str(name or "").strip().lower())
+        if field and field not in columns:
+            columns[field] = index
+    return columns
+
+def read_import_rows(file_path):
+    # Yields (line_number, row values) from a CSV or .xlsx file one row at a time
+    if file_path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for line_number, row in enumerate(wb.active.iter_rows(values_only=True), start=1):
+                yield line_number, row
+        finally:
+            wb.close()
+    else:
+        with open(file_path, newline="", encoding="utf-8-sig") as f:
+            for line_number, row in enumerate(csv.reader(f), start=1):
+                yield line_number, row
+
+def import_expenses(user_id, file_path, progress=None):
+    # Streams the file, validates each row with the add-expense rules and inserts in
+    # executemany batches, committing every IMPORT_COMMIT_ROWS rows.
+    # progress(rows_read, imported, error_count, rows_per_second) is called after each batch;
+    # raising TaskCancelled from it stops the import there, keeping the rows inserted so far
+    categories = {name.lower(): category_id for category_id, name in category_cache.load()}
+    rows = read_import_rows(file_path)
+    try:
+        _, header = next(rows)
+    except StopIteration:
+        raise ValueError("The file is empty")
+    columns = import_columns(header, IMPORT_COLUMNS)
+    if "amount" not in columns or "date" not in columns:
+        raise ValueError("The first row must name the Amount and Date columns")
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else None
+
+    imported = 0
+    pending = 0
+    rows_read = 0
+    error_count = 0
+    errors = []
+    batch = []
+    cancelled = False
+    start = time.perf_counter()
+    db = db_connection()
+    try:
+        cur = db.cursor()
+
+        def flush():
+            nonlocal imported, pending
+            cur.executemany("INSERT INTO expenses (user_id, amount, spent_on, note, category_ids) VALUES (%s, %s, %s, %s, %s)", batch)
+            adjust_rollups(cur, user_id, [(spent_on, category_id, amount, 1) for _, amount, spent_on, _, category_id in batch])
+            imported += len(batch)
+            pending += len(batch)
+            batch.clear()
+            if pending >= IMPORT_COMMIT_ROWS:
+                bump_data_version(cur, expense_version_name(user_id))
+                db.commit()
+                pending = 0
+            if progress:
+                elapsed = time.perf_counter() - start
+                progress(rows_read, imported, error_count, rows_read / elapsed if elapsed else 0.0)
+
+        try:
+            for line_number, row in rows:
+                if not any(value not in (None, "") for value in row):
+                    continue
+                # The TOTAL line at the end of an exported workbook
+                if str(row[0]).strip().upper() == "TOTAL":
+                    continue
+                rows_read += 1
+                try:
+                    amount = parse_amount(cell(row, "amount"))
+                    spent_on = parse_date(cell(row, "date"))
+                    category_name = str(cell(row, "category") or "").strip()
+                    category_id = None
+                    if category_name and category_name.lower() != "uncategorized":
+                        category_id = categories.get(category_name.lower())
+                        if category_id is None:
+                            raise ValueError(f"Unknown category '{category_name}'")
+                    note = str(cell(row, "note") or "").strip()
+                    if len(note) > MAX_NOTE_LENGTH:
+                        raise ValueError(f"Note longer than {MAX_NOTE_LENGTH} characters")
+                except ValueError as e:
+                    error_count += 1
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append((line_number, str(e)))
+                    continue
+                batch.append((user_id, amount, spent_on, note if note else None, category_id))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        except TaskCancelled:
+            # Raised by progress after a whole batch, so the rows inserted so far are
+            # committed below rather than leaving an unknown number behind
+            cancelled = True
+        if pending:
+            bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+    finally:
+        rows.close()
+        db.close()
+    return ImportResult(imported, error_count, errors, time.perf_counter() - start, cancelled)
+
+def import_users(file_path, role="user", progress=None):
+    # Provisions accounts from a CSV or .xlsx file through insert_user, the same
+    # single-statement write as registration, batched as multi-row INSERTs. A batch
+    # that hits a duplicate key is rolled back as one statement and retried row by
+    # row, so each duplicate is reported against its own row and field.
+    # progress(rows_read, imported, error_count, rows_per_second) is called after each
+    # committed batch; raising TaskCancelled from it stops the import there
+    rows = read_import_rows(file_path)
+    try:
+        _, header = next(rows)
+    except StopIteration:
+        raise ValueError("The file is empty")
+    columns = import_columns(header, USER_IMPORT_COLUMNS)
+    missing = [field for field in ("fullname", "username", "email", "password") if field not in columns]
+    if missing:
+        raise ValueError("The first row must name the " + ", ".join(missing) + " columns")
+
+    def cell(row, field):
+        index = columns.get(field)
+        value = row[index] if index is not None and index < len(row) else None
+        return str(value if value is not None else "").strip()
+
+    imported = 0
+    rows_read = 0
+    error_count = 0
+    errors = []
+    batch = []
+    cancelled = False
+    start = time.perf_counter()
+
+    def record_error(line_number, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append((line_number, message))
+
+    hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+
+        def flush():
+            nonlocal imported
+            # hashlib releases the GIL while hashing, so the slow hashes run side by side
+            hashed = list(hash_pool.map(encrypt_password, [values[3] for _, values in batch]))
+            batch[:] = [(line_number, values[:3] + (encrypted,) + values[4:])
+                        for (line_number, values), encrypted in zip(batch, hashed)]
+            # The savepoint undoes any rows of a failed batch that were already written
+            cur.execute("SAVEPOINT user_batch")
+            try:
+                cur.executemany("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)",
+                                [values for _, values in batch])
+                cur.execute("RELEASE SAVEPOINT user_batch")
+                imported += len(batch)
+            except Exception as e:
+                if duplicate_user_error(e) is None:
+                    raise
+                cur.execute("ROLLBACK TO SAVEPOINT user_batch")
+                cur.execute("RELEASE SAVEPOINT user_batch")
+                for line_number, values in batch:
+                    try:
+                        insert_user(cur, *values)
+                        imported += 1
+                    except ValueError as error:
+                        record_error(line_number, str(error))
+            batch.clear()
+            bump_data_version(cur, "users")
+            db.commit()
+            if progress:
+                elapsed = time.perf_counter() - start
+                progress(rows_read, imported, error_count, rows_read / elapsed if elapsed else 0.0)
+
+        try:
+            for line_number, row in rows:
+                if not any(value not in (None, "") for value in row):
+                    continue
+                rows_read += 1
+                fields = {field: cell(row, field) for field in ("fullname", "username", "email", "password")}
+                row_role = cell(row, "role").lower() or role
+                empty = [field for field, value in fields.items() if not value]
+                too_long = [field for field, limit in USER_FIELD_LENGTHS.items() if len(fields[field]) > limit]
+                if empty:
+                    record_error(line_number, "Missing " + ", ".join(empty))
+                    continue
+                if too_long:
+                    record_error(line_number, "Too long: " + ", ".join(too_long))
+                    continue
+                if row_role not in USER_ROLES:
+                    record_error(line_number, f"Unknown role '{row_role}'")
+                    continue
+                batch.append((line_number, (fields["fullname"], fields["username"], fields["email"],
+                                            fields["password"], row_role)))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        except TaskCancelled:
+            # Every batch is committed before progress runs, so imported is what was kept
+            cancelled = True
+    finally:
+        rows.close()
+        db.close()
+        hash_pool.shutdown()
+    # Duplicates found when a batch is retried are reported after that batch's other errors
+    errors.sort()
+    return ImportResult(imported, error_count, errors, time.perf_counter() - start, cancelled)
+
+# EXCEL EXPORT
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_COLUMN_WIDTHS = {"A": 8, "B": 12, "C": 15, "D": 20, "E": 40}
+
+def export_expenses_xlsx(user_id, file_path, progress=None, expense_filter=None):
+    # Streams rows from an unbuffered cursor in chunks straight into a write-only
+    # workbook, so memory stays flat however many expenses are exported.
+    # progress(rows_written, rows_per_second) is called after every chunk.
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.cell import WriteOnlyCell
+
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=12)
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    total_font = Font(bold=True, size=12)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("My Expenses")
+    # Write-only sheets need column widths before the first row is appended
+    for column, width in EXPORT_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    def styled_cell(value, font, fill=None, alignment=None):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = font
+        if fill:
+            cell.fill = fill
+        if alignment:
+            cell.alignment = alignment
+        return cell
+
+    ws.append([styled_cell(header, header_font, header_fill, header_alignment)
+               for header in ["ID", "Amount", "Date", "Category", "Note"]])
+
+    sql, params = build_expense_page_query(user_id, expense_filter, limit=None)
+    total_amount = Decimal("0.00")
+    rows_written = 0
+    start = time.perf_counter()
+    db = db_connection()
     try:
-        # Connect without database to check if it exists
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        cur = conn.cursor()
-        
-        # Create database if not exists
-        cur.execute("CREATE DATABASE IF NOT EXISTS expense")
-        cur.execute("USE expense")
-        
-        # Create users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                fullname VARCHAR(50) NOT NULL,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role ENUM('admin','user') DEFAULT 'user'
-            )
-        """)
-        
-        # Create categories table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
-                category_id INT AUTO_INCREMENT PRIMARY KEY,
-                category_name VARCHAR(50) UNIQUE NOT NULL
-            )
-        """)
-        
-        # Create expenses table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                spent_on DATE NOT NULL,
-                note VARCHAR(255),
-                category_ids INT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (category_ids) REFERENCES categories(category_id)
-            )
-        """)
-        
-        conn.commit()
-        print("Database and tables initialized successfully!")
-        
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+        cur = db.cursor(buffered=False)
+        cur.execute(sql, params)
+        while True:
+            chunk = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            for expense in chunk:
+                ws.append([
+                    expense[0],
+                    expense[1],
+                    expense[2].strftime('%Y-%m-%d') if expense[2] else '',
+                    expense[3] if expense[3] else 'Uncategorized',
+                    expense[4] if expense[4] else ''
+                ])
+                total_amount += expense[1]
+            rows_written += len(chunk)
+            if progress:
+                elapsed = time.perf_counter() - start
+                progress(rows_written, rows_written / elapsed if elapsed else 0.0)
     finally:
-        conn.close()
+        db.close()
 
-# DATABASE CONNECTION
-def db_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="expense"
-    )
-
-# PASSWORD ENCRYPTION
-def encrypt_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    ws.append([styled_cell("TOTAL", total_font), styled_cell(total_amount, total_font)])
+    wb.save(file_path)
+    elapsed = time.perf_counter() - start
+    return rows_written, total_amount, elapsed
 
-# INITIALIZE DATABASE WITH CATEGORIES
-def initialize_categories():
+# QUERY PLAN CHECK
+def check_query_plans():
+    # EXPLAIN the dashboard queries against real data and report whether MySQL
+    # picks the expense indexes and avoids a filesort
+    if not storage_engine().supports_explain:
+        raise ValueError(f"check-indexes reads MySQL EXPLAIN output and is not available with the {DB_ENGINE} engine")
+    db = db_connection()
     try:
-        db = db_connection()
         cur = db.cursor()
-        categories_list = [
-            ('Food',), ('Groceries',), ('Dining Out',), ('Travel',), ('Transport',),
-            ('Fuel',), ('Accommodation',), ('Utilities',), ('Electricity',), ('Water',),
-            ('Internet',), ('Mobile',), ('Health',), ('Medical',), ('Pharmacy',),
-            ('Insurance',), ('Entertainment',), ('Movies',), ('Games',), ('Streaming',),
-            ('Shopping',), ('Clothing',), ('Electronics',), ('Education',), ('Books',),
-            ('Courses',), ('Fitness',), ('Gym',), ('Hobbies',), ('Gifts',),
-            ('Charity',), ('Miscellaneous',)
+        cur.execute("""
+            SELECT user_id, category_ids, spent_on, id FROM expenses
+            WHERE category_ids IS NOT NULL ORDER BY id DESC LIMIT 1
+        """)
+        sample = cur.fetchone()
+        if not sample:
+            return []
+        user_id, category_id, spent_on, expense_id = sample
+        by_category = ExpenseFilter(category_ids=(category_id,))
+        by_dates = ExpenseFilter(date_from=spent_on.replace(day=1), date_to=spent_on)
+        checks = [
+            ("expense page", build_expense_page_query(user_id)),
+            ("expense page (next)", build_expense_page_query(user_id, after=(spent_on, expense_id))),
+            ("expense page (previous)", build_expense_page_query(user_id, before=(spent_on, expense_id))),
+            ("expense page by category", build_expense_page_query(user_id, by_category)),
+            ("expense page by date range", build_expense_page_query(user_id, by_dates)),
+            ("expense totals", build_expense_summary_query(user_id)[:2]),
+            ("expense totals by category", build_expense_summary_query(user_id, expense_filter=by_category)[:2]),
+            ("expense totals by date range", build_expense_summary_query(user_id, expense_filter=by_dates)[:2]),
         ]
-        cur.executemany("INSERT IGNORE INTO categories (category_name) VALUES (%s)", categories_list)
-        db.commit()
-    except Exception as e:
-        print(f"Error initializing categories: {e}")
+        cur.execute("SELECT note FROM expenses WHERE user_id=%s AND note IS NOT NULL ORDER BY id DESC LIMIT 1", (user_id,))
+        row = cur.fetchone()
+        words = [word for word in re.findall(r"\w+", row[0] if row else "") if len(word) >= FULLTEXT_MIN_WORD]
+        if words:
+            by_note = ExpenseFilter(note=words[0])
+            checks.append(("expense note search", build_expense_page_query(user_id, by_note)))
+            checks.append(("expense note search (ranked)", build_expense_search_query(user_id, by_note)))
+        cur.execute("SELECT role, fullname, id, username FROM users ORDER BY id DESC LIMIT 1")
+        user = cur.fetchone()
+        if user:
+            checks.append(("user directory", build_user_page_query()))
+            checks.append(("user directory (next)", build_user_page_query(after=user[:3])))
+            checks.append(("user directory search", build_user_page_query(user[3][:3])))
+        results = []
+        for name, (sql, params) in checks:
+            cur = db.cursor(dictionary=True)
+            cur.execute("EXPLAIN " + sql, params)
+            for row in cur.fetchall():
+                if row["table"] not in ("e", "expenses", "users"):
+                    continue
+                key = row["key"] or ""
+                extra = row["Extra"] or ""
+                if name.startswith("expense note search"):
+                    # The few full-text matches are sorted after the lookup by design
+                    ok = key == "ft_expenses_note"
+                elif name == "user directory search":
+                    # Each prefix branch is a range on its own index; the matches are sorted afterwards
+                    ok = key in ("username", "email", "idx_users_role_name")
+                elif name.startswith("user directory"):
+                    ok = key == "idx_users_role_name" and "filesort" not in extra
+                else:
+                    ok = key.startswith("idx_expenses_") and "filesort" not in extra
+                results.append((name, key or None, extra, ok))
+        return results
     finally:
         db.close()
 
-# BACKGROUND IMAGE SETUP
-bg_label = None
+def print_query_plan_report():
+    results = check_query_plans()
+    if not results:
+        print("No categorized expenses yet - add some data before checking query plans")
+        return True
+    for name, key, extra, ok in results:
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: key={key} extra={extra}")
+    return all(result[3] for result in results)
 
-def set_background_image(window):
-    global bg_label
-    try:
-        if bg_label:
-            bg_label.destroy()
-            
-        image_path = r"" # Specify your background image path here currently iam keeping it as empty
-        if os.path.exists(image_path):
-            window.update_idletasks()
-            width = window.winfo_width() if window.winfo_width() >= 400 else 900
-            height = window.winfo_height() if window.winfo_height() >= 300 else 650
-            
-            image = Image.open(image_path)
-            image = image.resize((width, height), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(image)
-            
-            bg_label = tk.Label(window, image=photo)
-            bg_label.image = photo
-            bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-            bg_label.lower()
-            return True
+# BACKGROUND TASKS
+TASK_WORKERS = 4
+TASK_POLL_MS = 50
+BUSY_DELAY = 0.15   # seconds before the busy indicator appears
+
+class TaskCancelled(Exception):
+    pass
+
+class BackgroundTask:
+    def __init__(self, runner, work, on_done, on_error, busy_text, owner, cancellable, on_cancelled=None):
+        self.runner = runner
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancelled = on_cancelled
+        self.name = busy_text
+        self.busy_text = busy_text
+        self.owner = owner
+        self.cancellable = cancellable
+        self.started = time.monotonic()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    # Called from the worker thread by long-running work between chunks
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def progress(self, text):
+        self.runner.messages.put((self, "progress", text))
+
+class TaskRunner:
+    # Runs database work on a thread pool. Workers never touch Tk; results are
+    # queued and applied to widgets on the main thread by polling with after()
+    def __init__(self, root, workers=TASK_WORKERS, poll_interval=TASK_POLL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expense-db")
+        self.messages = queue.Queue()
+        self.active = []
+        self.busy_frame = None
+        self.busy_label = None
+        self.cancel_button = None
+        self.busy = False
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, work, on_done=None, on_error=None, busy_text="Working...", owner=None, cancellable=True,
+               on_cancelled=None):
+        task = BackgroundTask(self, work, on_done, on_error, busy_text, owner, cancellable, on_cancelled)
+        self.active.append(task)
+        self.executor.submit(self._run, task)
+        return task
+
+    def _run(self, task):
+        try:
+            with profiler.timed("task", task.name):
+                result = task.work(task)
+        except BaseException as e:
+            self.messages.put((task, "error", e))
+        else:
+            self.messages.put((task, "done", result))
+
+    def visible_tasks(self):
+        # Tasks without busy text (e.g. background rendering) never show the indicator
+        now = time.monotonic()
+        return [task for task in self.active
+                if task.busy_text and not task.cancelled and now - task.started >= BUSY_DELAY]
+
+    def cancel_all(self):
+        # The Cancel button only stops what the indicator is showing; silent work
+        # such as resuming interrupted deletions carries on
+        for task in self.visible_tasks():
+            if task.cancellable:
+                task.cancel()
+        self._update_busy()
+
+    def shutdown(self):
+        for task in self.active:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    task, kind, payload = self.messages.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "progress":
+                    task.busy_text = payload
+                    continue
+                self.active.remove(task)
+                if task.owner is not None and not task.owner.winfo_exists():
+                    continue
+                on_done = task.on_done
+                if task.cancelled:
+                    # A cancelled result is dropped, unless the work keeps what it
+                    # committed before stopping (imports) and reports it to on_cancelled
+                    if kind != "done" or task.on_cancelled is None:
+                        continue
+                    on_done = task.on_cancelled
+                try:
+                    with profiler.timed("ui", task.name):
+                        if kind == "error":
+                            if not isinstance(payload, TaskCancelled):
+                                (task.on_error or show_task_error)(payload)
+                        elif on_done:
+                            on_done(payload)
+                except Exception as e:
+                    show_task_error(e)
+            self._update_busy()
+        finally:
+            self.root.after(self.poll_interval, self._poll)
+
+    def _update_busy(self):
+        visible = self.visible_tasks()
+        if not visible:
+            if self.busy:
+                self.busy = False
+                if self.busy_frame is not None and self.busy_frame.winfo_exists():
+                    self.busy_frame.place_forget()
+                self.root.config(cursor="")
+            return
+        self.busy = True
+        # Screens destroy every child of the window, so rebuild the indicator on demand
+        if self.busy_frame is None or not self.busy_frame.winfo_exists():
+            self.busy_frame = tk.Frame(self.root, bg='#34495e')
+            self.busy_label = tk.Label(self.busy_frame, bg='#34495e', fg='white', font=("Arial", 9))
+            self.busy_label.pack(side="left", padx=8, pady=4)
+            self.cancel_button = tk.Button(self.busy_frame, text="Cancel", command=self.cancel_all, bg='#e74c3c', fg='white', font=("Arial", 8))
+        self.busy_label.config(text=visible[-1].busy_text)
+        if any(task.cancellable for task in visible):
+            self.cancel_button.pack(side="left", padx=4, pady=2)
         else:
+            self.cancel_button.pack_forget()
+        self.busy_frame.place(relx=1.0, rely=1.0, anchor="se", x=-12, y=-12)
+        self.busy_frame.lift()
+        self.root.config(cursor="watch")
+
+tasks = None
+
+def run_task(work, on_done=None, on_error=None, busy_text="Working...", owner=None, cancellable=True, on_cancelled=None):
+    return tasks.submit(work, on_done, on_error, busy_text, owner, cancellable, on_cancelled)
+
+def show_task_error(error):
+    # Validation problems raised by the data layer are ValueErrors; everything else is a database failure
+    if isinstance(error, ValueError):
+        messagebox.showerror("Error", str(error))
+    else:
+        messagebox.showerror("Database Error", str(error))
+
+# BACKGROUND IMAGE SETUP
+BACKGROUND_IMAGE_PATH = r"" # Specify your background image path here currently iam keeping it as empty
+BACKGROUND_CACHE_SIZE = 8     # scaled images kept, keyed by window size
+RESIZE_DEBOUNCE_MS = 150      # <Configure> events within this window collapse into one resize
+
+class BackgroundRenderer:
+    # Decodes the source image once, resamples off the main thread and keeps an
+    # LRU cache of PhotoImages per window size, so page switches reuse a cached
+    # image and a window drag triggers a single resize once it settles
+    def __init__(self, path, cache_size=BACKGROUND_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.source = None
+        self.failed = False
+        self.label = None
+        self.pending = None
+        self.rendering = None
+        self._source_lock = threading.Lock()
+
+    def enabled(self):
+        return not self.failed and bool(self.path) and os.path.exists(self.path)
+
+    def window_size(self, window):
+        window.update_idletasks()
+        width = window.winfo_width() if window.winfo_width() >= 400 else 900
+        height = window.winfo_height() if window.winfo_height() >= 300 else 650
+        return width, height
+
+    def apply(self, window):
+        if not self.enabled():
             window.configure(bg='#f0f0f0')
             return False
+        # Screens destroy every child of the window, the label included
+        if self.label is None or not self.label.winfo_exists():
+            self.label = tk.Label(window, bd=0)
+            if self.cache:
+                self._show(next(reversed(self.cache.values())))
+        self.label.place(x=0, y=0, relwidth=1, relheight=1)
+        self.label.lower()
+        size = self.window_size(window)
+        photo = self.cache.get(size)
+        if photo is not None:
+            self.cache.move_to_end(size)
+            self._show(photo)
+        else:
+            self._request(window, size)
+        return True
+
+    def schedule_resize(self, window):
+        if not self.enabled():
+            return
+        if self.pending is not None:
+            window.after_cancel(self.pending)
+        self.pending = window.after(RESIZE_DEBOUNCE_MS, lambda: self._resize_now(window))
+
+    def _resize_now(self, window):
+        self.pending = None
+        self.apply(window)
+
+    def _show(self, photo):
+        self.label.configure(image=photo)
+        self.label.image = photo
+
+    def _request(self, window, size):
+        # Only one resample runs at a time; a newer size is picked up when it finishes
+        if self.rendering is not None:
+            return
+        self.rendering = size
+        run_task(lambda task: self._render(size), lambda result: self._rendered(window, result),
+                 on_error=lambda e: self._render_failed(window), busy_text=None, cancellable=False)
+
+    def _render(self, size):
+        # Worker thread: decode once, then resample from the decoded source
+        with self._source_lock:
+            if self.source is None:
+                image = Image.open(self.path)
+                image.load()
+                self.source = image
+            return size, self.source.resize(size, Image.Resampling.LANCZOS)
+
+    def _rendered(self, window, result):
+        size, image = result
+        self.rendering = None
+        photo = ImageTk.PhotoImage(image)
+        self.cache[size] = photo
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        if self.window_size(window) == size:
+            if self.label is not None and self.label.winfo_exists():
+                self._show(photo)
+        else:
+            self.apply(window)
+
+    def _render_failed(self, window):
+        self.rendering = None
+        self.failed = True
+        if self.label is not None and self.label.winfo_exists():
+            self.label.destroy()
+        window.configure(bg='#f0f0f0')
+
+background = BackgroundRenderer(BACKGROUND_IMAGE_PATH)
+
+@profiled("ui")
+def set_background_image(window):
+    try:
+        return background.apply(window)
     except Exception as e:
         window.configure(bg='#f0f0f0')
         return False
 
 def on_window_resize(event):
     if event.widget == window:
-        window.after(100, lambda: set_background_image(window))
+        background.schedule_resize(window)
 
 # NAVIGATION SYSTEM
+# Screens keep their widgets between visits; pages marked with @cached_screen
+# are built once and only hidden, everything else is rebuilt on each visit
 history = []
 forward_stack = []
+screen_cache = {}
+building_screen = None
+
+def cached_screen(page_func):
+    page_func.cached = True
+    return page_func
+
+def on_screen_show(callback):
+    # Registers a refresh hook that runs whenever a built screen is shown again
+    if building_screen is not None:
+        building_screen.on_show = callback
+
+class Screen:
+    def __init__(self, page_func, args):
+        self.page_func = page_func
+        self.args = args
+        self.widgets = []
+        self.geometry = []
+        self.on_show = None
+        self.built = False
+
+    @property
+    def cached(self):
+        return getattr(self.page_func, "cached", False)
+
+    def show(self):
+        global building_screen
+        if self.built:
+            for widget, manager, info in self.geometry:
+                if manager == "place":
+                    widget.place(**info)
+                elif manager == "pack":
+                    widget.pack(**info)
+            self.geometry = []
+            if self.on_show is not None:
+                with profiler.timed("screen refresh", self.page_func.__name__):
+                    self.on_show()
+            return
+        before = set(window.winfo_children())
+        building_screen = self
+        try:
+            with profiler.timed("screen", self.page_func.__name__):
+                self.page_func(*self.args)
+        finally:
+            building_screen = None
+        self.widgets = [widget for widget in window.winfo_children() if widget not in before]
+        self.built = True
+
+    def hide(self):
+        if not self.built:
+            return
+        if not self.cached:
+            self.destroy()
+            return
+        # Remember the current geometry so the screen comes back exactly as it was left
+        self.geometry = []
+        for widget in self.widgets:
+            if not widget.winfo_exists():
+                continue
+            manager = widget.winfo_manager()
+            if manager == "place":
+                info = widget.place_info()
+                widget.place_forget()
+            elif manager == "pack":
+                info = widget.pack_info()
+                widget.pack_forget()
+            else:
+                continue
+            info = {("in_" if key == "in" else key): value for key, value in info.items() if value != ""}
+            self.geometry.append((widget, manager, info))
+
+    def destroy(self):
+        for widget in self.widgets:
+            if widget.winfo_exists():
+                widget.destroy()
+        self.widgets = []
+        self.geometry = []
+        self.on_show = None
+        self.built = False
+
+def get_screen(page_func, args):
+    if not getattr(page_func, "cached", False):
+        return Screen(page_func, args)
+    key = (page_func, args)
+    if key not in screen_cache:
+        screen_cache[key] = Screen(page_func, args)
+    return screen_cache[key]
 
 def navigate_to(page_func, *args):
     global history, forward_stack
-    current = window.winfo_children()
-    if current:
-        history.append(page_func)
+    screen = get_screen(page_func, args)
+    if history and history[-1] is screen:
+        return
+    if history:
+        history[-1].hide()
+    history.append(screen)
     forward_stack.clear()
-    for widget in window.winfo_children():
-        widget.destroy()
     set_background_image(window)
-    page_func(*args)
+    screen.show()
 
 def go_back():
     global history, forward_stack
-    if history:
-        current_page = history.pop()
-        forward_stack.append(current_page)
-        for widget in window.winfo_children():
-            widget.destroy()
+    if len(history) > 1:
+        current_screen = history.pop()
+        current_screen.hide()
+        forward_stack.append(current_screen)
         set_background_image(window)
-        history[-1]() if history else show_main_menu()
+        history[-1].show()
+
+def reset_navigation():
+    # Drops every screen, e.g. on logout, so the next user starts from fresh widgets
+    global history, forward_stack
+    for screen in history + forward_stack + list(screen_cache.values()):
+        screen.destroy()
+    history = []
+    forward_stack = []
+    screen_cache.clear()
+
+def end_session():
+    close_session()
+    reset_navigation()
+    navigate_to(show_main_menu)
 
 # STYLED FRAME
 def create_styled_frame(parent, width=400, height=300):
@@ -166,51 +2901,86 @@ def create_styled_frame(parent, width=400, height=300):
     frame.configure(highlightbackground='lightgray', highlightthickness=1)
     return frame
 
-# CHECK IF ADMIN EXISTS
-def admin_exists():
-    try:
-        db = db_connection()
-        cur = db.cursor()
-        cur.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
-        count = cur.fetchone()[0]
-        return count > 0
-    except:
-        return False
-    finally:
-        db.close()
+# CHARTS
+CHART_COLORS = ['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6', '#16a085', '#e67e22', '#34495e']
+CHART_TOP_CATEGORIES = 10
+
+def draw_bar_chart(canvas, title, items, horizontal=False):
+    # items are (label, amount); bars are scaled to the largest amount and the
+    # chart fills whatever size the canvas currently has
+    canvas.delete("all")
+    width = max(canvas.winfo_width(), 200)
+    height = max(canvas.winfo_height(), 120)
+    canvas.create_text(width // 2, 12, text=title, font=("Arial", 11, "bold"), fill='#2c3e50')
+    if not any(amount for _, amount in items):
+        canvas.create_text(width // 2, height // 2, text="No expenses in this range", fill='gray')
+        return
+    largest = max(amount for _, amount in items)
+    top = 30
+    if horizontal:
+        label_width, value_width = 120, 100
+        space = (height - top - 5) / len(items)
+        for index, (label, amount) in enumerate(items):
+            y = top + index * space
+            length = (width - label_width - value_width) * float(amount / largest)
+            canvas.create_text(label_width - 6, y + space / 2, text=label, anchor='e', font=("Arial", 9))
+            canvas.create_rectangle(label_width, y + 2, label_width + length, y + space - 2,
+                                    fill=CHART_COLORS[index % len(CHART_COLORS)], outline='')
+            canvas.create_text(label_width + length + 6, y + space / 2, text=f"Rs.{amount}", anchor='w', font=("Arial", 9))
+    else:
+        left, bottom = 10, height - 25
+        space = (width - 2 * left) / len(items)
+        # Label every n-th bar so month labels never overlap
+        label_every = len(items) * 50 // width + 1
+        for index, (label, amount) in enumerate(items):
+            x = left + index * space
+            bar_height = (bottom - top - 10) * float(amount / largest)
+            canvas.create_rectangle(x + 1, bottom - bar_height, x + space - 1, bottom, fill=CHART_COLORS[0], outline='')
+            if index % label_every == 0:
+                canvas.create_text(x + space / 2, bottom + 12, text=label, font=("Arial", 8))
+        canvas.create_line(left, bottom, width - left, bottom, fill='gray')
+        canvas.create_text(width - left, top, text=f"Highest: Rs.{largest}", anchor='ne', font=("Arial", 8), fill='gray')
 
 # MAIN MENU
+@cached_screen
 def show_main_menu():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
-    # Check if admin exists
-    has_admin = admin_exists()
-    
     main_frame = create_styled_frame(window)
-    if has_admin:
-        main_frame.place(relx=0.5, rely=0.5, anchor='center', width=350, height=250)
-    else:
-        main_frame.place(relx=0.5, rely=0.5, anchor='center', width=350, height=290)
+    main_frame.place(relx=0.5, rely=0.5, anchor='center', width=350, height=250)
     
     tk.Label(main_frame, text="Expense Tracker", font=("Arial", 20, "bold"), bg='white', fg='#2c3e50').pack(pady=20)
     
-    if not has_admin:
-        tk.Button(main_frame, text="Register as Admin", width=20, command=lambda: navigate_to(register_admin), bg='#e74c3c', fg='white', font=("Arial", 10, "bold")).pack(pady=8)
-    
-    tk.Button(main_frame, text="Login as Admin", width=20, command=lambda: navigate_to(admin_login), bg='#3498db', fg='white', font=("Arial", 10)).pack(pady=8)
+    admin_login_button = tk.Button(main_frame, text="Login as Admin", width=20, command=lambda: navigate_to(admin_login), bg='#3498db', fg='white', font=("Arial", 10))
+    admin_login_button.pack(pady=8)
     tk.Button(main_frame, text="Login as User", width=20, command=lambda: navigate_to(user_login), bg='#2ecc71', fg='white', font=("Arial", 10)).pack(pady=8)
     tk.Button(main_frame, text="Register", width=20, command=lambda: navigate_to(register_user), bg='#f39c12', fg='white', font=("Arial", 10)).pack(pady=8)
+    
+    # Check if admin exists; the first-admin option is added once the answer arrives
+    # and removed again when the menu is revisited after the first admin registered
+    registration = {"button": None}
+
+    def show_admin_registration(has_admin):
+        button = registration["button"]
+        if not has_admin and button is None:
+            main_frame.place_configure(height=290)
+            registration["button"] = tk.Button(main_frame, text="Register as Admin", width=20, command=lambda: navigate_to(register_admin), bg='#e74c3c', fg='white', font=("Arial", 10, "bold"))
+            registration["button"].pack(pady=8, before=admin_login_button)
+        elif has_admin and button is not None:
+            button.destroy()
+            registration["button"] = None
+            main_frame.place_configure(height=250)
+    
+    def check_admin():
+        run_task(lambda task: admin_exists(), show_admin_registration, busy_text="Checking setup...", owner=main_frame)
+
+    def refresh():
+        if registration["button"] is not None:
+            check_admin()
+
+    check_admin()
+    on_screen_show(refresh)
 
 # REGISTER ADMIN (Only for first-time setup)
 def register_admin():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=380)
 
@@ -234,12 +3004,6 @@ def register_admin():
     password_entry.pack(pady=5)
 
     def submit():
-        # Double-check no admin exists
-        if admin_exists():
-            messagebox.showerror("Error", "Admin already exists! Only existing admins can create new admins.")
-            navigate_to(show_main_menu)
-            return
-        
         fullname = fullname_entry.get().strip()
         username = username_entry.get().strip()
         email = email_entry.get().strip()
@@ -249,39 +3013,24 @@ def register_admin():
             messagebox.showerror("Error", "All fields are required")
             return
 
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT email FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Email already exists")
-                return
-            cur.execute("SELECT username FROM users WHERE username=%s", (username,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Username already exists")
-                return
-            
-            cur.execute("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)", 
-                       (fullname, username, email, encrypted, 'admin'))
-            db.commit()
-            messagebox.showinfo("Success", "Admin account created successfully! Please login.")
-            navigate_to(show_main_menu)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+        def work(task):
+            # Only succeeds while no admin exists, even if two people register at once
+            return create_user_account(fullname, username, email, password, 'admin', first_admin=True)
+
+        def done(new_id):
+            if new_id is None:
+                messagebox.showerror("Error", "Admin already exists! Only existing admins can create new admins.")
+            else:
+                messagebox.showinfo("Success", "Admin account created successfully! Please login.")
+            go_back()
+
+        run_task(work, done, busy_text="Creating admin account...", owner=main_frame, cancellable=False)
 
     tk.Button(main_frame, text="Create Admin Account", command=submit, bg='#e74c3c', fg='white', width=20).pack(pady=15)
     tk.Button(main_frame, text="Back", command=go_back, bg='lightgray', width=20).pack()
 
 # REGISTER USER
 def register_user():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=380)
 
@@ -313,39 +3062,18 @@ def register_user():
             messagebox.showerror("Error", "All fields are required")
             return
 
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT email FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Email already exists")
-                return
-            cur.execute("SELECT username FROM users WHERE username=%s", (username,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Username already exists")
-                return
-            
-            cur.execute("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)", 
-                       (fullname, username, email, encrypted, 'user'))
-            db.commit()
+        def done(new_id):
             messagebox.showinfo("Success", "Registration successful! Please login.")
-            navigate_to(show_main_menu)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            go_back()
+
+        run_task(lambda task: create_user_account(fullname, username, email, password, 'user'), done,
+                 busy_text="Registering...", owner=main_frame, cancellable=False)
 
     tk.Button(main_frame, text="Register", command=submit, bg='#2ecc71', fg='white', width=15).pack(pady=15)
     tk.Button(main_frame, text="Back", command=go_back, bg='lightgray', width=15).pack()
 
 # ADMIN LOGIN
 def admin_login():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=300)
 
@@ -367,31 +3095,19 @@ def admin_login():
             messagebox.showerror("Error", "Please enter both username and password")
             return
             
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT id, role FROM users WHERE username=%s AND password=%s", (username, encrypted))
-            result = cur.fetchone()
-            if result and result[1] == "admin":
-                navigate_to(admin_dashboard, result[0])
+        def done(user):
+            if user:
+                navigate_to(admin_dashboard, start_session(user))
             else:
                 messagebox.showerror("Error", "Invalid admin credentials")
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+
+        run_task(lambda task: authenticate(username, password, "admin"), done, busy_text="Logging in...", owner=main_frame)
 
     tk.Button(main_frame, text="Login", command=login, bg='#3498db', fg='white', width=15).pack(pady=15)
     tk.Button(main_frame, text="Back", command=go_back, bg='lightgray', width=15).pack()
 
 # USER LOGIN
 def user_login():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=300)
 
@@ -413,31 +3129,20 @@ def user_login():
             messagebox.showerror("Error", "Please enter both username and password")
             return
             
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT id, role, fullname FROM users WHERE username=%s AND password=%s", (username, encrypted))
-            result = cur.fetchone()
-            if result and result[1] == "user":
-                navigate_to(user_dashboard, result[0], result[2])
+        def done(user):
+            if user:
+                navigate_to(user_dashboard, start_session(user))
             else:
                 messagebox.showerror("Error", "Invalid user credentials")
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+
+        run_task(lambda task: authenticate(username, password, "user"), done, busy_text="Logging in...", owner=main_frame)
 
     tk.Button(main_frame, text="Login", command=login, bg='#2ecc71', fg='white', width=15).pack(pady=15)
     tk.Button(main_frame, text="Back", command=go_back, bg='lightgray', width=15).pack()
 
 # ADMIN DASHBOARD
-def admin_dashboard(admin_id):
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-
+@cached_screen
+def admin_dashboard(session):
     container = tk.Frame(window, bg='white', relief='raised', bd=2)
     container.pack(fill='both', expand=True, padx=10, pady=10)
 
@@ -456,39 +3161,168 @@ def admin_dashboard(admin_id):
 
     # USERS TAB
     tk.Label(users_frame, text="Users Management", font=("Arial", 14, "bold")).pack(pady=5)
-    
-    users_table = ttk.Treeview(users_frame, columns=("ID", "Fullname", "Username", "Email", "Role"), show="headings", height=12)
+
+    user_search_frame = tk.Frame(users_frame)
+    user_search_frame.pack(fill="x", padx=5)
+    tk.Label(user_search_frame, text="Search username, email or name:").pack(side="left", padx=2)
+    user_search_entry = tk.Entry(user_search_frame, width=30)
+    user_search_entry.pack(side="left", padx=2)
+
+    users_table_frame = tk.Frame(users_frame)
+    users_table_frame.pack(fill="both", expand=True, padx=5, pady=5)
+
+    users_table = ttk.Treeview(users_table_frame, columns=("ID", "Fullname", "Username", "Email", "Role"), show="headings", height=12)
     users_table.heading("ID", text="ID")
     users_table.heading("Fullname", text="Full Name")
     users_table.heading("Username", text="Username")
     users_table.heading("Email", text="Email")
     users_table.heading("Role", text="Role")
-    users_table.pack(fill="both", expand=True, padx=5, pady=5)
+    users_scrollbar = ttk.Scrollbar(users_table_frame, orient="vertical", command=users_table.yview)
+    users_scrollbar.pack(side="right", fill="y")
+    users_table.pack(side="left", fill="both", expand=True)
+
+    # Data versions the tables were last filled from, compared when the dashboard is shown again
+    shown = {"users": None, "categories": None}
+
+    # Users are paged on (role, fullname, id) like the expense list; generation
+    # changes on every refresh so late results from an older query are dropped
+    # patching counts single-user re-reads still in flight
+    user_pager = {"search": "", "last_key": None, "exhausted": True, "loading": False, "generation": 0, "patching": 0}
+
+    def show_user_page(rows):
+        # Items are keyed by user id so single rows can be patched after an edit
+        for row in rows:
+            users_table.insert("", "end", iid=str(row[0]), values=row)
+        if rows:
+            user_pager["last_key"] = (rows[-1][4], rows[-1][1], rows[-1][0])
+        user_pager["exhausted"] = len(rows) < USER_PAGE_SIZE
+        user_pager["loading"] = False
+
+    def user_page_failed(error):
+        user_pager["exhausted"] = True
+        user_pager["loading"] = False
+        show_task_error(error)
+
+    def for_user_generation(callback):
+        generation = user_pager["generation"]
+        return lambda result: callback(result) if generation == user_pager["generation"] else None
+
+    def load_more_users():
+        if user_pager["exhausted"] or user_pager["loading"]:
+            return
+        user_pager["loading"] = True
+        search, last_key = user_pager["search"], user_pager["last_key"]
+        run_task(lambda task: fetch_user_page(search, last_key),
+                 for_user_generation(show_user_page), for_user_generation(user_page_failed),
+                 busy_text="Loading users...", owner=users_table, cancellable=False)
+
+    def on_users_scroll(first, last):
+        users_scrollbar.set(first, last)
+        if float(last) >= 0.9 and not user_pager["exhausted"]:
+            window.after_idle(load_more_users)
+
+    users_table.configure(yscrollcommand=on_users_scroll)
 
     def refresh_users_table():
-        for item in users_table.get_children():
-            users_table.delete(item)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT id, fullname, username, email, role FROM users ORDER BY role, fullname")
-            for row in cur.fetchall():
-                users_table.insert("", "end", values=row)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+        users_table.delete(*users_table.get_children())
+        shown["users"] = None
+        # Re-reads still in flight are dropped by their generation check
+        user_pager["patching"] = 0
+        user_pager["generation"] += 1
+        user_pager["last_key"] = None
+        user_pager["exhausted"] = True
+        user_pager["loading"] = True
+        search = user_pager["search"]
+
+        def work(task):
+            # Read the stamp before the rows so a concurrent change is never recorded as seen
+            version = get_data_version("users")
+            return version, fetch_user_page(search)
+
+        def done(result):
+            version, rows = result
+            show_user_page(rows)
+            shown["users"] = version
+
+        run_task(work, for_user_generation(done), for_user_generation(user_page_failed),
+                 busy_text="Loading users...", owner=users_table, cancellable=False)
 
     refresh_users_table()
 
+    def user_sort_key(role, fullname, user_id):
+        # Approximates the case-insensitive collation MySQL sorts by
+        return (USER_ROLES.index(role) if role in USER_ROLES else len(USER_ROLES), str(fullname).lower(), int(user_id))
+
+    def place_user_row(row):
+        # Binary search over the loaded items, which are ordered by (role, fullname, id)
+        key = user_sort_key(row[4], row[1], row[0])
+        last_key = user_pager["last_key"]
+        if not user_pager["exhausted"] and last_key is not None and key > user_sort_key(*last_key):
+            return  # Beyond the loaded pages; it arrives with the page that covers it
+        children = users_table.get_children()
+        low, high = 0, len(children)
+        while low < high:
+            middle = (low + high) // 2
+            values = users_table.item(children[middle])["values"]
+            if user_sort_key(values[4], values[1], values[0]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        users_table.insert("", low, iid=str(row[0]), values=row)
+
+    def user_saved(user_id):
+        # Re-read just the saved user. The stamp moves by one per write, so any other
+        # change since the list was filled means it is reloaded instead
+        def work(task):
+            version = get_data_version("users")
+            return version, fetch_user(user_id)
+
+        generation = user_pager["generation"]
+
+        def failed(error):
+            if generation != user_pager["generation"]:
+                return  # The list was reloaded meanwhile, which reset the count
+            user_pager["patching"] -= 1
+            refresh_users_table()
+
+        def done(result):
+            if generation != user_pager["generation"]:
+                return
+            user_pager["patching"] -= 1
+            version, row = result
+            if shown["users"] is None or version != shown["users"] + 1:
+                refresh_users_table()
+                return
+            iid = str(user_id)
+            if users_table.exists(iid):
+                users_table.delete(iid)
+            if row is not None and user_matches(user_pager["search"], row):
+                place_user_row(row)
+            shown["users"] = version
+
+        user_pager["patching"] += 1
+        run_task(work, done, failed, busy_text=None, owner=users_table, cancellable=False)
+
+    def search_users():
+        user_pager["search"] = user_search_entry.get().strip()
+        refresh_users_table()
+
+    def clear_user_search():
+        user_search_entry.delete(0, tk.END)
+        search_users()
+
+    user_search_entry.bind("<Return>", lambda event: search_users())
+    tk.Button(user_search_frame, text="Search", command=search_users, bg='#3498db', fg='white').pack(side="left", padx=2)
+    tk.Button(user_search_frame, text="Clear", command=clear_user_search, bg='lightgray').pack(side="left", padx=2)
+
     user_buttons_frame = tk.Frame(users_frame)
     user_buttons_frame.pack(pady=10)
 
     def add_admin():
-        navigate_to(admin_create_admin)
+        navigate_to(admin_create_admin, user_saved)
 
     def add_user():
-        navigate_to(admin_add_user)
+        navigate_to(admin_add_user, user_saved)
 
     def edit_user():
         selected = users_table.selection()
@@ -496,7 +3330,36 @@ def admin_dashboard(admin_id):
             messagebox.showerror("Error", "Please select a user to edit")
             return
         user_data = users_table.item(selected)["values"]
-        navigate_to(admin_edit_user, user_data)
+        navigate_to(admin_edit_user, user_data, user_saved)
+
+    def import_users_file():
+        file_path = filedialog.askopenfilename(
+            filetypes=[("User files", "*.csv *.xlsx"), ("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def work(task):
+            def report(rows, imported, errors, rate):
+                task.check_cancelled()
+                task.progress(f"Added {imported:,} of {rows:,} users ({rate:,.0f} rows/sec)")
+            return import_users(file_path, progress=report)
+
+        def done(result):
+            message = f"Added {result.imported} users in {result.elapsed:.1f}s."
+            if result.cancelled:
+                messagebox.showwarning("Import Cancelled", message + "\n\nThe import was cancelled; these users were kept.")
+            elif result.error_count:
+                lines = [f"Row {line}: {error}" for line, error in result.errors[:15]]
+                if result.error_count > len(lines):
+                    lines.append(f"...and {result.error_count - len(lines)} more")
+                message += f"\n\n{result.error_count} rows were skipped:\n" + "\n".join(lines)
+                messagebox.showwarning("Import Finished", message)
+            else:
+                messagebox.showinfo("Import Finished", message)
+            refresh_users_table()
+
+        run_task(work, done, busy_text="Importing users...", owner=users_table, on_cancelled=done)
 
     def delete_user():
         selected = users_table.selection()
@@ -509,23 +3372,24 @@ def admin_dashboard(admin_id):
             return
         
         if messagebox.askyesno("Confirm", f"Delete user '{user_data[2]}'?"):
-            try:
-                db = db_connection()
-                cur = db.cursor()
-                cur.execute("DELETE FROM expenses WHERE user_id=%s", (user_data[0],))
-                cur.execute("DELETE FROM users WHERE id=%s", (user_data[0],))
-                db.commit()
+            def done(result):
                 messagebox.showinfo("Success", "User deleted")
-                refresh_users_table()
-            except Exception as e:
-                messagebox.showerror("Database Error", str(e))
-            finally:
-                db.close()
+                user_saved(user_data[0])
+
+            # Runs in chunks; cancelling stops between chunks and the rest is resumed later
+            def work(task):
+                def report(rows_done):
+                    task.progress(f"Deleting user '{user_data[2]}': {rows_done:,} expenses removed")
+                    task.check_cancelled()
+                return remove_user(user_data[0], report)
+
+            run_task(work, done, busy_text=f"Deleting user '{user_data[2]}'...", owner=users_table)
 
     tk.Button(user_buttons_frame, text="Create New Admin", command=add_admin, width=15, bg='#9b59b6', fg='white').pack(side="left", padx=5)
     tk.Button(user_buttons_frame, text="Add User", command=add_user, width=12, bg='#2ecc71', fg='white').pack(side="left", padx=5)
     tk.Button(user_buttons_frame, text="Edit User", command=edit_user, width=12, bg='#f39c12', fg='white').pack(side="left", padx=5)
     tk.Button(user_buttons_frame, text="Delete User", command=delete_user, width=12, bg='#e74c3c', fg='white').pack(side="left", padx=5)
+    tk.Button(user_buttons_frame, text="Import Users", command=import_users_file, width=12, bg='#16a085', fg='white').pack(side="left", padx=5)
 
     # CATEGORIES TAB
     tk.Label(categories_frame, text="Categories Management", font=("Arial", 14, "bold")).pack(pady=5)
@@ -535,22 +3399,47 @@ def admin_dashboard(admin_id):
     categories_table.heading("Name", text="Category Name")
     categories_table.pack(fill="both", expand=True, padx=5, pady=5)
 
-    def refresh_categories_table():
-        for item in categories_table.get_children():
-            categories_table.delete(item)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
-            for row in cur.fetchall():
+    def refresh_categories_table(busy_text="Loading categories..."):
+        def done(rows):
+            if shown["categories"] is not None and shown["categories"] == session.categories.version:
+                return
+            categories_table.delete(*categories_table.get_children())
+            for row in rows:
                 categories_table.insert("", "end", values=row)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            shown["categories"] = session.categories.version
+
+        run_task(lambda task: session.categories.load(), done, busy_text=busy_text, owner=categories_table)
 
     refresh_categories_table()
 
+    # Finish user and category deletions that were cancelled or interrupted
+    def resume_maintenance():
+        def work(task):
+            def report(job, rows_done):
+                task.progress(f"Resuming interrupted deletions: {rows_done:,} expenses processed")
+                task.check_cancelled()
+            return resume_maintenance_jobs(report)
+
+        def done(jobs):
+            if jobs:
+                refresh_users_table()
+                refresh_categories_table()
+
+        run_task(work, done, on_error=lambda e: None, busy_text=None, owner=users_table)
+
+    resume_maintenance()
+
+    def refresh_changed():
+        def done(version):
+            # A pending re-read from user_saved settles the list itself
+            if (shown["users"] is None or version > shown["users"]) and not user_pager["patching"]:
+                refresh_users_table()
+
+        run_task(lambda task: session.data_version("users"), done, busy_text=None, owner=users_table)
+        refresh_categories_table(busy_text=None)
+
+    on_screen_show(refresh_changed)
+
     cat_buttons_frame = tk.Frame(categories_frame)
     cat_buttons_frame.pack(pady=10)
 
@@ -558,21 +3447,13 @@ def admin_dashboard(admin_id):
         category_name = tk.simpledialog.askstring("Add Category", "Enter category name:")
         if not category_name:
             return
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT category_id FROM categories WHERE category_name=%s", (category_name.strip(),))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Category already exists")
-                return
-            cur.execute("INSERT INTO categories (category_name) VALUES (%s)", (category_name.strip(),))
-            db.commit()
+
+        def done(category_id):
             messagebox.showinfo("Success", "Category added")
             refresh_categories_table()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+
+        run_task(lambda task: insert_category(category_name.strip()), done, busy_text="Adding category...",
+                 owner=categories_table, cancellable=False)
 
     def delete_category():
         selected = categories_table.selection()
@@ -582,18 +3463,17 @@ def admin_dashboard(admin_id):
         cat_data = categories_table.item(selected)["values"]
         
         if messagebox.askyesno("Confirm", f"Delete category '{cat_data[1]}'?"):
-            try:
-                db = db_connection()
-                cur = db.cursor()
-                cur.execute("UPDATE expenses SET category_ids=NULL WHERE category_ids=%s", (cat_data[0],))
-                cur.execute("DELETE FROM categories WHERE category_id=%s", (cat_data[0],))
-                db.commit()
+            def done(result):
                 messagebox.showinfo("Success", "Category deleted")
                 refresh_categories_table()
-            except Exception as e:
-                messagebox.showerror("Database Error", str(e))
-            finally:
-                db.close()
+
+            def work(task):
+                def report(rows_done):
+                    task.progress(f"Deleting category '{cat_data[1]}': {rows_done:,} expenses uncategorized")
+                    task.check_cancelled()
+                return remove_category(cat_data[0], report)
+
+            run_task(work, done, busy_text=f"Deleting category '{cat_data[1]}'...", owner=categories_table)
 
     tk.Button(cat_buttons_frame, text="Add Category", command=add_category, width=12, bg='#2ecc71', fg='white').pack(side="left", padx=5)
     tk.Button(cat_buttons_frame, text="Delete Category", command=delete_category, width=12, bg='#e74c3c', fg='white').pack(side="left", padx=5)
@@ -603,17 +3483,27 @@ def admin_dashboard(admin_id):
     
     def logout():
         if messagebox.askyesno("Logout", "Are you sure?"):
-            navigate_to(show_main_menu)
+            end_session()
     
-    tk.Button(nav_frame, text="Logout", command=logout, bg='lightgray', width=12).pack()
+    def save_profile():
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            initialfile=f"expense_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        if not file_path:
+            return
+        try:
+            profiler.dump(file_path)
+            messagebox.showinfo("Success", f"Performance profile saved to: {file_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save profile: {str(e)}")
+    
+    tk.Button(nav_frame, text="Save Profile", command=save_profile, bg='#95a5a6', fg='white', width=12).pack(side="left", padx=5)
+    tk.Button(nav_frame, text="Logout", command=logout, bg='lightgray', width=12).pack(side="left", padx=5)
 
 # ADMIN CREATE NEW ADMIN
-def admin_create_admin():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
+def admin_create_admin(on_saved=None):
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=380)
 
@@ -645,39 +3535,20 @@ def admin_create_admin():
             messagebox.showerror("Error", "All fields are required")
             return
 
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT email FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Email already exists")
-                return
-            cur.execute("SELECT username FROM users WHERE username=%s", (username,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Username already exists")
-                return
-            
-            cur.execute("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)", 
-                       (fullname, username, email, encrypted, 'admin'))
-            db.commit()
+        def done(new_id):
             messagebox.showinfo("Success", "New admin account created successfully!")
-            navigate_to(admin_dashboard, cur.lastrowid)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            if on_saved:
+                on_saved(new_id)
+            go_back()
+
+        run_task(lambda task: create_user_account(fullname, username, email, password, 'admin'), done,
+                 busy_text="Creating admin account...", owner=main_frame, cancellable=False)
 
     tk.Button(main_frame, text="Create Admin", command=submit, bg='#9b59b6', fg='white', width=15).pack(pady=15)
-    tk.Button(main_frame, text="Cancel", command=lambda: navigate_to(admin_dashboard, 1), bg='lightgray', width=15).pack()
+    tk.Button(main_frame, text="Cancel", command=go_back, bg='lightgray', width=15).pack()
 
 # ADMIN ADD USER
-def admin_add_user():
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
+def admin_add_user(on_saved=None):
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=380)
 
@@ -709,39 +3580,20 @@ def admin_add_user():
             messagebox.showerror("Error", "All fields are required")
             return
 
-        encrypted = encrypt_password(password)
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("SELECT email FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Email already exists")
-                return
-            cur.execute("SELECT username FROM users WHERE username=%s", (username,))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Username already exists")
-                return
-            
-            cur.execute("INSERT INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)", 
-                       (fullname, username, email, encrypted, 'user'))
-            db.commit()
+        def done(new_id):
             messagebox.showinfo("Success", "User added successfully!")
-            navigate_to(admin_dashboard, 1)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            if on_saved:
+                on_saved(new_id)
+            go_back()
+
+        run_task(lambda task: create_user_account(fullname, username, email, password, 'user'), done,
+                 busy_text="Adding user...", owner=main_frame, cancellable=False)
 
     tk.Button(main_frame, text="Add User", command=submit, bg='#2ecc71', fg='white', width=15).pack(pady=15)
-    tk.Button(main_frame, text="Cancel", command=lambda: navigate_to(admin_dashboard, 1), bg='lightgray', width=15).pack()
+    tk.Button(main_frame, text="Cancel", command=go_back, bg='lightgray', width=15).pack()
 
 # ADMIN EDIT USER
-def admin_edit_user(user_data):
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
+def admin_edit_user(user_data, on_saved=None):
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=400, height=420)
 
@@ -776,53 +3628,26 @@ def admin_edit_user(user_data):
             messagebox.showerror("Error", "Name, username, and email are required")
             return
 
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            
-            # Check if email already exists for another user
-            cur.execute("SELECT id FROM users WHERE email=%s AND id != %s", (email, user_data[0]))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Email already exists")
-                return
-            
-            # Check if username already exists for another user
-            cur.execute("SELECT id FROM users WHERE username=%s AND id != %s", (username, user_data[0]))
-            if cur.fetchone():
-                messagebox.showerror("Error", "Username already exists")
-                return
-            
-            # Update user
-            if password:
-                encrypted = encrypt_password(password)
-                cur.execute("UPDATE users SET fullname=%s, username=%s, email=%s, password=%s WHERE id=%s", 
-                           (fullname, username, email, encrypted, user_data[0]))
-            else:
-                cur.execute("UPDATE users SET fullname=%s, username=%s, email=%s WHERE id=%s", 
-                           (fullname, username, email, user_data[0]))
-            
-            db.commit()
+        def done(result):
             messagebox.showinfo("Success", "User updated successfully!")
-            navigate_to(admin_dashboard, 1)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            if on_saved:
+                on_saved(user_data[0])
+            go_back()
+
+        run_task(lambda task: update_user_account(user_data[0], fullname, username, email, password),
+                 done, busy_text="Updating user...", owner=main_frame, cancellable=False)
 
     tk.Button(main_frame, text="Update User", command=submit, bg='#f39c12', fg='white', width=15).pack(pady=15)
-    tk.Button(main_frame, text="Cancel", command=lambda: navigate_to(admin_dashboard, 1), bg='lightgray', width=15).pack()
+    tk.Button(main_frame, text="Cancel", command=go_back, bg='lightgray', width=15).pack()
 
 # USER DASHBOARD
-def user_dashboard(user_id, fullname):
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
+@cached_screen
+def user_dashboard(session):
+    user_id = session.user.id
     container = tk.Frame(window, bg='white', relief='raised', bd=2)
     container.pack(fill='both', expand=True, padx=10, pady=10)
 
-    tk.Label(container, text=f"Welcome, {fullname}", font=("Arial", 16, "bold"), bg='white', fg='#2c3e50').pack(pady=10)
+    tk.Label(container, text=f"Welcome, {session.user.fullname}", font=("Arial", 16, "bold"), bg='white', fg='#2c3e50').pack(pady=10)
 
     notebook = ttk.Notebook(container)
     notebook.pack(fill="both", expand=True, padx=10, pady=10)
@@ -835,6 +3660,10 @@ def user_dashboard(user_id, fullname):
     view_frame = ttk.Frame(notebook)
     notebook.add(view_frame, text="My Expenses")
 
+    # Reports Tab
+    reports_frame = ttk.Frame(notebook)
+    notebook.add(reports_frame, text="Reports")
+
     # ADD EXPENSE TAB
     tk.Label(add_frame, text="Add New Expense", font=("Arial", 14, "bold")).pack(pady=15)
     
@@ -852,19 +3681,8 @@ def user_dashboard(user_id, fullname):
     
     tk.Label(form_frame, text="Category:").grid(row=2, column=0, sticky="e", padx=5, pady=8)
     
-    try:
-        db = db_connection()
-        cur = db.cursor()
-        cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
-        categories = cur.fetchall()
-        db.close()
-        category_options = [f"{cat[1]}" for cat in categories]
-    except:
-        categories = []
-        category_options = []
-    
     category_var = tk.StringVar()
-    category_combo = ttk.Combobox(form_frame, textvariable=category_var, values=category_options, width=23)
+    category_combo = ttk.Combobox(form_frame, textvariable=category_var, values=[], width=23)
     category_combo.grid(row=2, column=1, padx=5, pady=8)
     
     tk.Label(form_frame, text="Note:").grid(row=3, column=0, sticky="e", padx=5, pady=8)
@@ -873,45 +3691,32 @@ def user_dashboard(user_id, fullname):
 
     def add_expense():
         try:
-            amount = float(amount_entry.get().strip())
-            if amount <= 0:
-                raise ValueError
-        except:
+            amount = parse_amount(amount_entry.get())
+        except ValueError:
             messagebox.showerror("Error", "Invalid amount")
             return
         
         date_str = date_entry.get().strip()
         try:
-            datetime.strptime(date_str, "%Y-%m-%d")
-        except:
+            parse_date(date_str)
+        except ValueError:
             messagebox.showerror("Error", "Invalid date format")
             return
         
         category_name = category_var.get().strip()
-        category_id = None
-        if category_name:
-            for cat in categories:
-                if cat[1] == category_name:
-                    category_id = cat[0]
-                    break
+        category_id = session.categories.id_for(category_name) if category_name else None
         
         note = note_entry.get().strip()
         
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("INSERT INTO expenses (user_id, amount, spent_on, note, category_ids) VALUES (%s, %s, %s, %s, %s)",
-                       (user_id, amount, date_str, note if note else None, category_id))
-            db.commit()
+        def done(change):
             messagebox.showinfo("Success", "Expense added successfully!")
             amount_entry.delete(0, tk.END)
             note_entry.delete(0, tk.END)
             category_var.set('')
-            refresh_expenses()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            apply_change(change)
+
+        run_task(lambda task: insert_expense(user_id, amount, date_str, note if note else None, category_id),
+                 done, busy_text="Adding expense...", owner=amount_entry, cancellable=False)
 
     tk.Button(form_frame, text="Add Expense", command=add_expense, bg='#2ecc71', fg='white', width=15).grid(row=4, column=0, columnspan=2, pady=20)
 
@@ -921,73 +3726,310 @@ def user_dashboard(user_id, fullname):
     filter_frame = tk.Frame(view_frame)
     filter_frame.pack(pady=5)
     
-    tk.Label(filter_frame, text="Filter by Category:").pack(side="left", padx=5)
-    filter_var = tk.StringVar(value="All")
-    filter_options = ["All"] + category_options
-    filter_combo = ttk.Combobox(filter_frame, textvariable=filter_var, values=filter_options, width=15)
-    filter_combo.pack(side="left", padx=5)
+    # Nothing selected in the category list means every category
+    tk.Label(filter_frame, text="Categories:").grid(row=0, column=0, rowspan=2, sticky="ne", padx=5)
+    filter_list = tk.Listbox(filter_frame, selectmode="multiple", exportselection=False, height=3, width=18)
+    filter_list.grid(row=0, column=1, rowspan=2, padx=5, pady=2)
+
+    tk.Label(filter_frame, text="From:").grid(row=0, column=2, sticky="e", padx=2)
+    date_from_entry = tk.Entry(filter_frame, width=11)
+    date_from_entry.grid(row=0, column=3, padx=2, pady=2)
+    tk.Label(filter_frame, text="To:").grid(row=0, column=4, sticky="e", padx=2)
+    date_to_entry = tk.Entry(filter_frame, width=11)
+    date_to_entry.grid(row=0, column=5, padx=2, pady=2)
+
+    tk.Label(filter_frame, text="Min Rs.:").grid(row=1, column=2, sticky="e", padx=2)
+    min_amount_entry = tk.Entry(filter_frame, width=11)
+    min_amount_entry.grid(row=1, column=3, padx=2, pady=2)
+    tk.Label(filter_frame, text="Max Rs.:").grid(row=1, column=4, sticky="e", padx=2)
+    max_amount_entry = tk.Entry(filter_frame, width=11)
+    max_amount_entry.grid(row=1, column=5, padx=2, pady=2)
+
+    tk.Label(filter_frame, text="Search notes:").grid(row=0, column=6, sticky="e", padx=2)
+    note_filter_entry = tk.Entry(filter_frame, width=15)
+    note_filter_entry.grid(row=0, column=7, columnspan=2, padx=2, pady=2)
+    ranked_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(filter_frame, text="Best matches first", variable=ranked_var).grid(row=1, column=6, sticky="w", padx=2)
+
+    # Data versions the combos and the table were last filled from, compared when the dashboard is shown again
+    shown = {"expenses": None, "categories": None}
+
+    def show_categories(rows):
+        category_options = [name for _, name in rows]
+        category_combo.configure(values=category_options)
+        selected = {filter_list.get(index) for index in filter_list.curselection()}
+        bulk_category_combo.configure(values=["Uncategorized"] + category_options)
+        filter_list.delete(0, tk.END)
+        for index, name in enumerate(["Uncategorized"] + category_options):
+            filter_list.insert(tk.END, name)
+            if name in selected:
+                filter_list.selection_set(index)
+        shown["categories"] = session.categories.version
+
+    def load_categories():
+        # A failed lookup leaves the category lists empty, as before
+        run_task(lambda task: session.categories.load(), show_categories, on_error=lambda e: None,
+                 busy_text="Loading categories...", owner=category_combo)
+
+    load_categories()
+    
+    table_frame = tk.Frame(view_frame)
+    table_frame.pack(fill="both", expand=True, padx=5, pady=5)
     
-    expenses_table = ttk.Treeview(view_frame, columns=("ID", "Amount", "Date", "Category", "Note"), show="headings", height=10)
+    expenses_table = ttk.Treeview(table_frame, columns=("ID", "Amount", "Date", "Category", "Note"), show="headings", height=10)
     expenses_table.heading("ID", text="ID")
     expenses_table.heading("Amount", text="Amount")
     expenses_table.heading("Date", text="Date")
     expenses_table.heading("Category", text="Category")
     expenses_table.heading("Note", text="Note")
-    expenses_table.pack(fill="both", expand=True, padx=5, pady=5)
+    expenses_scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=expenses_table.yview)
+    expenses_scrollbar.pack(side="right", fill="y")
+    expenses_table.pack(side="left", fill="both", expand=True)
 
     total_label = tk.Label(view_frame, text="Total: Rs.0.00", font=("Arial", 12, "bold"), fg='#e74c3c')
     total_label.pack(pady=5)
 
+    # Only a window of at most EXPENSE_WINDOW_ROWS rows around the part the user is
+    # looking at is held in the table. Pages are fetched on demand using the
+    # (spent_on, id) key of the last loaded row, or of the first one when scrolling
+    # back over rows that were dropped (evicted_above). generation changes on every
+    # refresh so late results from an older query are dropped
+    pager = {"filter": None, "ranked": False, "last_key": None, "exhausted": True, "evicted_above": False,
+             "loading": False, "generation": 0}
+
+    # Running total of the rows matching the current filter, adjusted by single-row changes
+    totals = {"total": Decimal("0.00"), "count": 0}
+
+    def show_totals():
+        total_label.config(text=f"Total: Rs.{totals['total']} ({totals['count']} expenses)")
+
+    def row_key(iid):
+        return (date.fromisoformat(expenses_table.set(iid, "Date")), int(iid))
+
+    def keep_in_view(anchor):
+        children = expenses_table.get_children()
+        if anchor and expenses_table.exists(anchor):
+            expenses_table.yview_moveto(expenses_table.index(anchor) / len(children))
+
+    def evict_rows(from_top, anchor):
+        # Drops the rows furthest from the new page, keeping the same rows in view
+        children = expenses_table.get_children()
+        excess = len(children) - EXPENSE_WINDOW_ROWS
+        if excess > 0 and from_top:
+            expenses_table.delete(*children[:excess])
+            pager["evicted_above"] = True
+        elif excess > 0:
+            expenses_table.delete(*children[-excess:])
+            pager["last_key"] = row_key(children[-excess - 1])
+            pager["exhausted"] = False
+        keep_in_view(anchor)
+
+    def show_page(rows):
+        # Items are keyed by expense id so single rows can be patched later
+        anchor = expenses_table.identify_row(1)
+        for row in rows:
+            expenses_table.insert("", "end", iid=str(row[0]), values=row)
+        if rows:
+            pager["last_key"] = (rows[-1][2], rows[-1][0])
+        pager["exhausted"] = len(rows) < EXPENSE_PAGE_SIZE
+        pager["loading"] = False
+        evict_rows(True, anchor)
+
+    def show_previous_page(rows):
+        anchor = expenses_table.identify_row(1)
+        for index, row in enumerate(rows):
+            expenses_table.insert("", index, iid=str(row[0]), values=row)
+        pager["evicted_above"] = len(rows) == EXPENSE_PAGE_SIZE
+        pager["loading"] = False
+        evict_rows(False, anchor)
+
+    def page_failed(error):
+        pager["exhausted"] = True
+        pager["loading"] = False
+        show_task_error(error)
+
+    def for_generation(callback):
+        generation = pager["generation"]
+        return lambda result: callback(result) if generation == pager["generation"] else None
+
+    def load_more_expenses():
+        if pager["exhausted"] or pager["loading"]:
+            return
+        pager["loading"] = True
+        expense_filter, last_key = pager["filter"], pager["last_key"]
+        run_task(lambda task: fetch_expense_page(user_id, expense_filter, last_key),
+                 for_generation(show_page), for_generation(page_failed),
+                 busy_text="Loading expenses...", owner=expenses_table, cancellable=False)
+
+    def load_previous_expenses():
+        children = expenses_table.get_children()
+        if not pager["evicted_above"] or pager["loading"] or not children:
+            return
+        pager["loading"] = True
+        expense_filter, first_key = pager["filter"], row_key(children[0])
+        run_task(lambda task: fetch_expense_page(user_id, expense_filter, before=first_key),
+                 for_generation(show_previous_page), for_generation(page_failed),
+                 busy_text="Loading expenses...", owner=expenses_table, cancellable=False)
+
+    def on_table_scroll(first, last):
+        expenses_scrollbar.set(first, last)
+        if float(last) >= 0.9 and not pager["exhausted"]:
+            window.after_idle(load_more_expenses)
+        elif float(first) <= 0.1 and pager["evicted_above"]:
+            window.after_idle(load_previous_expenses)
+
+    expenses_table.configure(yscrollcommand=on_table_scroll)
+
     def refresh_expenses():
-        for item in expenses_table.get_children():
-            expenses_table.delete(item)
-        
-        filter_category = filter_var.get()
-        total = 0
-        
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            
-            if filter_category == "All":
-                cur.execute("""
-                    SELECT e.id, e.amount, e.spent_on, c.category_name, e.note
-                    FROM expenses e
-                    LEFT JOIN categories c ON e.category_ids = c.category_id
-                    WHERE e.user_id = %s
-                    ORDER BY e.spent_on DESC
-                """, (user_id,))
+        expenses_table.delete(*expenses_table.get_children())
+        shown["expenses"] = None
+        pager["generation"] += 1
+        pager["last_key"] = None
+        pager["exhausted"] = True
+        pager["evicted_above"] = False
+        pager["loading"] = True
+        expense_filter, ranked = pager["filter"], pager["ranked"]
+
+        def work(task):
+            # Read the stamp before the rows so a concurrent change is never recorded as seen
+            version = get_data_version(expense_version_name(user_id))
+            summary = expense_total(user_id, expense_filter)
+            if not summary.count:
+                rows = []
+            elif ranked:
+                rows = search_expenses(user_id, expense_filter)
             else:
-                cat_id = None
-                for cat in categories:
-                    if cat[1] == filter_category:
-                        cat_id = cat[0]
-                        break
-                cur.execute("""
-                    SELECT e.id, e.amount, e.spent_on, c.category_name, e.note
-                    FROM expenses e
-                    LEFT JOIN categories c ON e.category_ids = c.category_id
-                    WHERE e.user_id = %s AND e.category_ids = %s
-                    ORDER BY e.spent_on DESC
-                """, (user_id, cat_id))
-            
-            for row in cur.fetchall():
-                expenses_table.insert("", "end", values=row)
-                total += float(row[1])
-            
-            total_label.config(text=f"Total: Rs.{total:.2f}")
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+                rows = fetch_expense_page(user_id, expense_filter)
+            return version, summary, rows
+
+        def done(result):
+            version, summary, rows = result
+            totals["total"], totals["count"] = summary.total, summary.count
+            show_totals()
+            show_page(rows)
+            if ranked:
+                # Only the best SEARCH_RESULT_LIMIT matches are listed; the total still covers all of them
+                pager["exhausted"] = True
+            shown["expenses"] = version
+
+        run_task(work, for_generation(done), for_generation(page_failed),
+                 busy_text="Loading expenses...", owner=expenses_table, cancellable=False)
+
+    def matches_filter(record):
+        return expense_matches(pager["filter"], record)
+
+    def place_row(record):
+        # Binary search over the loaded items, which are ordered by (spent_on, id) descending
+        key = (str(record.spent_on), record.id)
+        last_key = pager["last_key"]
+        if not pager["exhausted"] and last_key is not None and key < (str(last_key[0]), last_key[1]):
+            return  # Beyond the loaded pages; it arrives with the page that covers it
+        children = expenses_table.get_children()
+        if pager["evicted_above"] and children and key > (expenses_table.set(children[0], "Date"), int(children[0])):
+            return  # Above the window; it arrives when the user scrolls back up
+        low, high = 0, len(children)
+        while low < high:
+            middle = (low + high) // 2
+            if (expenses_table.set(children[middle], "Date"), int(children[middle])) > key:
+                low = middle + 1
+            else:
+                high = middle
+        expenses_table.insert("", low, iid=str(record.id), values=row_values(record))
+
+    def row_values(record):
+        return (record.id, record.amount, record.spent_on, session.categories.name_for(record.category_id), record.note)
+
+    def apply_changes(changes):
+        # changes come from one transaction and share its version. Any other write
+        # since the table was filled, or a reload still in flight, means patching
+        # rows is not enough. Ranked results have no date order to insert into,
+        # so they are simply searched again
+        if not changes:
+            return
+        version = changes[0].version
+        if shown["expenses"] is None or version != shown["expenses"] + 1 or pager["ranked"]:
+            refresh_expenses()
+            return
+        selection = set(expenses_table.selection())
+        for change in changes:
+            iid = str(change.expense_id)
+            before, after = change.before, change.after
+            was_shown = before is not None and matches_filter(before)
+            stays_shown = after is not None and matches_filter(after)
+            if was_shown:
+                totals["total"] -= before.amount
+                totals["count"] -= 1
+            if stays_shown:
+                totals["total"] += after.amount
+                totals["count"] += 1
+            if was_shown and stays_shown and before.spent_on == after.spent_on and expenses_table.exists(iid):
+                # Same place in the (spent_on, id) order, so the item is updated in place
+                expenses_table.item(iid, values=row_values(after))
+                continue
+            if expenses_table.exists(iid):
+                expenses_table.delete(iid)
+            if stays_shown:
+                place_row(after)
+                if iid in selection and expenses_table.exists(iid):
+                    expenses_table.selection_add(iid)
+        show_totals()
+        shown["expenses"] = version
+
+    def apply_change(change):
+        apply_changes([change])
 
     def apply_filter():
+        category_ids = []
+        for index in filter_list.curselection():
+            name = filter_list.get(index)
+            if name == "Uncategorized":
+                category_ids.append(None)
+            elif session.categories.id_for(name) is not None:
+                category_ids.append(session.categories.id_for(name))
+        try:
+            pager["filter"] = make_expense_filter(
+                category_ids, date_from_entry.get(), date_to_entry.get(),
+                min_amount_entry.get(), max_amount_entry.get(), note_filter_entry.get()
+            )
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        pager["ranked"] = ranked_var.get() and bool(pager["filter"].note)
+        refresh_expenses()
+
+    def clear_filter():
+        filter_list.selection_clear(0, tk.END)
+        ranked_var.set(False)
+        for entry in (date_from_entry, date_to_entry, min_amount_entry, max_amount_entry, note_filter_entry):
+            entry.delete(0, tk.END)
+        pager["filter"] = None
+        pager["ranked"] = False
         refresh_expenses()
 
-    tk.Button(filter_frame, text="Apply Filter", command=apply_filter, bg='#3498db', fg='white').pack(side="left", padx=5)
+    tk.Button(filter_frame, text="Apply Filter", command=apply_filter, bg='#3498db', fg='white').grid(row=1, column=7, padx=2, pady=2)
+    tk.Button(filter_frame, text="Clear", command=clear_filter, bg='lightgray').grid(row=1, column=8, padx=2, pady=2)
 
     refresh_expenses()
 
+    def refresh_changed():
+        # Coming back to the dashboard only re-queries what another screen actually changed
+        def work(task):
+            session.categories.load()
+            return session.expense_version()
+
+        def done(version):
+            categories_changed = session.categories.version != shown["categories"]
+            if categories_changed:
+                show_categories(session.categories.rows)
+            if categories_changed or shown["expenses"] is None or version > shown["expenses"]:
+                refresh_expenses()
+            if notebook.select() == str(reports_frame):
+                show_reports()
+
+        run_task(work, done, on_error=lambda e: None, busy_text=None, owner=expenses_table)
+
+    on_screen_show(refresh_changed)
+
     expense_buttons_frame = tk.Frame(view_frame)
     expense_buttons_frame.pack(pady=10)
 
@@ -996,48 +4038,82 @@ def user_dashboard(user_id, fullname):
         if not selected:
             messagebox.showerror("Error", "Please select an expense to update")
             return
+        if len(selected) > 1:
+            messagebox.showerror("Error", "Please select a single expense to update")
+            return
         
         expense_data = expenses_table.item(selected)["values"]
-        navigate_to(user_update_expense, user_id, fullname, expense_data, categories)
+        navigate_to(user_update_expense, session, expense_data, apply_change)
+
+    def selection_total(selected):
+        return sum((Decimal(expenses_table.set(iid, "Amount")) for iid in selected), Decimal("0.00"))
 
     def delete_expense():
         selected = expenses_table.selection()
         if not selected:
             messagebox.showerror("Error", "Please select an expense")
             return
+        if len(selected) > 1:
+            delete_selected(selected)
+            return
         
         expense_id = expenses_table.item(selected)["values"][0]
         
         if messagebox.askyesno("Confirm", "Delete this expense?"):
-            try:
-                db = db_connection()
-                cur = db.cursor()
-                cur.execute("DELETE FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
-                db.commit()
+            def done(change):
                 messagebox.showinfo("Success", "Expense deleted")
-                refresh_expenses()
-            except Exception as e:
-                messagebox.showerror("Database Error", str(e))
-            finally:
-                db.close()
+                apply_change(change)
+
+            run_task(lambda task: remove_expense(user_id, expense_id), done, busy_text="Deleting expense...",
+                     owner=expenses_table, cancellable=False)
+
+    def delete_selected(selected):
+        expense_ids = [int(iid) for iid in selected]
+        if not messagebox.askyesno("Confirm", f"Delete {len(expense_ids)} selected expenses totalling Rs.{selection_total(selected)}?"):
+            return
+
+        def done(changes):
+            messagebox.showinfo("Success", f"{len(changes)} expenses deleted")
+            apply_changes(changes)
+
+        run_task(lambda task: remove_expenses(user_id, expense_ids), done, busy_text=f"Deleting {len(expense_ids)} expenses...",
+                 owner=expenses_table, cancellable=False)
+
+    def set_category():
+        selected = expenses_table.selection()
+        if not selected:
+            messagebox.showerror("Error", "Please select the expenses to recategorize")
+            return
+        category_name = bulk_category_var.get().strip()
+        if not category_name:
+            messagebox.showerror("Error", "Please choose a category")
+            return
+        category_id = None
+        if category_name != "Uncategorized":
+            category_id = session.categories.id_for(category_name)
+            if category_id is None:
+                messagebox.showerror("Error", f"Unknown category '{category_name}'")
+                return
+        expense_ids = [int(iid) for iid in selected]
+        if not messagebox.askyesno("Confirm", f"Move {len(expense_ids)} selected expenses totalling Rs.{selection_total(selected)} to '{category_name}'?"):
+            return
+
+        def done(changes):
+            messagebox.showinfo("Success", f"{len(changes)} expenses moved to '{category_name}'")
+            apply_changes(changes)
+
+        run_task(lambda task: recategorize_expenses(user_id, expense_ids, category_id), done,
+                 busy_text=f"Updating {len(expense_ids)} expenses...", owner=expenses_table, cancellable=False)
 
     def download_expenses():
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            
-            # Fetch all expenses for the user
-            cur.execute("""
-                SELECT e.id, e.amount, e.spent_on, c.category_name, e.note
-                FROM expenses e
-                LEFT JOIN categories c ON e.category_ids = c.category_id
-                WHERE e.user_id = %s
-                ORDER BY e.spent_on DESC
-            """, (user_id,))
-            
-            expenses_data = cur.fetchall()
-            
-            if not expenses_data:
+        # Exports exactly what the table shows under the current filter
+        expense_filter = pager["filter"]
+
+        def export_failed(error):
+            messagebox.showerror("Error", f"Failed to download expenses: {str(error)}")
+
+        def start_export(summary):
+            if summary.count == 0:
                 messagebox.showinfo("No Data", "No expenses to download")
                 return
             
@@ -1045,82 +4121,153 @@ def user_dashboard(user_id, fullname):
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".xlsx",
                 filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
-                initialfile=f"expenses_{fullname}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+                initialfile=f"expenses_{session.user.fullname}_{datetime.now().strftime('%Y%m%d')}.xlsx"
             )
             
             if not file_path:
                 return
             
-            # Create Excel workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "My Expenses"
+            def work(task):
+                def report(rows, rate):
+                    task.check_cancelled()
+                    task.progress(f"Exported {rows:,} of {summary.count:,} rows ({rate:,.0f} rows/sec)")
+                return export_expenses_xlsx(user_id, file_path, report, expense_filter)
             
-            # Header styling
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=12)
+            def done(result):
+                rows, total_amount, elapsed = result
+                export_status.config(text=f"Exported {rows} rows in {elapsed:.1f}s")
+                messagebox.showinfo("Success", f"Expenses downloaded successfully!\nSaved to: {file_path}")
             
-            # Add headers
-            headers = ["ID", "Amount", "Date", "Category", "Note"]
-            for col, header in enumerate(headers, start=1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Add data
-            total_amount = 0
-            for row_idx, expense in enumerate(expenses_data, start=2):
-                ws.cell(row=row_idx, column=1, value=expense[0])
-                ws.cell(row=row_idx, column=2, value=float(expense[1]))
-                ws.cell(row=row_idx, column=3, value=expense[2].strftime('%Y-%m-%d') if expense[2] else '')
-                ws.cell(row=row_idx, column=4, value=expense[3] if expense[3] else 'Uncategorized')
-                ws.cell(row=row_idx, column=5, value=expense[4] if expense[4] else '')
-                total_amount += float(expense[1])
-            
-            # Add total row
-            total_row = len(expenses_data) + 2
-            ws.cell(row=total_row, column=1, value="TOTAL")
-            ws.cell(row=total_row, column=1).font = Font(bold=True, size=12)
-            ws.cell(row=total_row, column=2, value=total_amount)
-            ws.cell(row=total_row, column=2).font = Font(bold=True, size=12)
-            
-            # Adjust column widths
-            ws.column_dimensions['A'].width = 8
-            ws.column_dimensions['B'].width = 12
-            ws.column_dimensions['C'].width = 15
-            ws.column_dimensions['D'].width = 20
-            ws.column_dimensions['E'].width = 40
-            
-            # Save file
-            wb.save(file_path)
-            messagebox.showinfo("Success", f"Expenses downloaded successfully!\nSaved to: {file_path}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to download expenses: {str(e)}")
-        finally:
-            db.close()
+            run_task(work, done, export_failed, busy_text="Exporting expenses...", owner=export_status)
+
+        run_task(lambda task: expense_total(user_id, expense_filter), start_export, export_failed,
+                 busy_text="Preparing export...", owner=export_status)
+
+    def import_file():
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Expense files", "*.csv *.xlsx"), ("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        def work(task):
+            def report(rows, imported, errors, rate):
+                task.check_cancelled()
+                task.progress(f"Imported {imported:,} of {rows:,} rows ({rate:,.0f} rows/sec)")
+            return import_expenses(user_id, file_path, report)
+        
+        def done(result):
+            rate = result.imported / result.elapsed if result.elapsed else 0
+            message = f"Imported {result.imported} expenses in {result.elapsed:.1f}s ({rate:,.0f} rows/sec)."
+            if result.cancelled:
+                # The rows imported before the cancel are kept, so importing the whole file again would duplicate them
+                messagebox.showwarning("Import Cancelled", message + "\n\nThe import was cancelled; these expenses were kept.")
+            elif result.error_count:
+                lines = [f"Row {line}: {error}" for line, error in result.errors[:15]]
+                if result.error_count > len(lines):
+                    lines.append(f"...and {result.error_count - len(lines)} more")
+                message += f"\n\n{result.error_count} rows were skipped:\n" + "\n".join(lines)
+                messagebox.showwarning("Import Finished", message)
+            else:
+                messagebox.showinfo("Import Finished", message)
+            refresh_expenses()
+        
+        run_task(work, done, busy_text="Importing expenses...", owner=expenses_table, on_cancelled=done)
 
     tk.Button(expense_buttons_frame, text="Update Expense", command=update_expense, bg='#f39c12', fg='white', width=15).pack(side="left", padx=5)
     tk.Button(expense_buttons_frame, text="Delete Expense", command=delete_expense, bg='#e74c3c', fg='white', width=15).pack(side="left", padx=5)
     tk.Button(expense_buttons_frame, text="Download to Excel", command=download_expenses, bg='#27ae60', fg='white', width=15).pack(side="left", padx=5)
+    tk.Button(expense_buttons_frame, text="Import File", command=import_file, bg='#16a085', fg='white', width=15).pack(side="left", padx=5)
+
+    # Shift/Ctrl-click selects several rows for the bulk actions
+    bulk_frame = tk.Frame(view_frame)
+    bulk_frame.pack()
+    selection_label = tk.Label(bulk_frame, text="", fg='gray')
+    selection_label.pack(side="left", padx=5)
+    tk.Label(bulk_frame, text="Set category of selected to:").pack(side="left", padx=5)
+    bulk_category_var = tk.StringVar()
+    bulk_category_combo = ttk.Combobox(bulk_frame, textvariable=bulk_category_var, values=[], state="readonly", width=18)
+    bulk_category_combo.pack(side="left", padx=5)
+    tk.Button(bulk_frame, text="Set Category", command=set_category, bg='#8e44ad', fg='white', width=12).pack(side="left", padx=5)
+
+    def on_selection_changed(event):
+        selected = expenses_table.selection()
+        if len(selected) > 1:
+            selection_label.config(text=f"{len(selected)} selected, Rs.{selection_total(selected)}")
+        else:
+            selection_label.config(text="")
+
+    expenses_table.bind("<<TreeviewSelect>>", on_selection_changed)
+
+    export_status = tk.Label(view_frame, text="", fg='gray')
+    export_status.pack()
+
+    # REPORTS TAB
+    report_controls = tk.Frame(reports_frame)
+    report_controls.pack(pady=5)
+    tk.Label(report_controls, text="Range:").pack(side="left", padx=5)
+    report_range_var = tk.StringVar(value=REPORT_RANGES[0])
+    report_range_combo = ttk.Combobox(report_controls, textvariable=report_range_var, values=REPORT_RANGES, state="readonly", width=15)
+    report_range_combo.pack(side="left", padx=5)
+    report_total = tk.Label(report_controls, text="", font=("Arial", 10, "bold"), fg='#e74c3c')
+    report_total.pack(side="left", padx=10)
+
+    category_chart = tk.Canvas(reports_frame, bg='white', height=180, highlightthickness=0)
+    category_chart.pack(fill="both", expand=True, padx=10, pady=5)
+    month_chart = tk.Canvas(reports_frame, bg='white', height=180, highlightthickness=0)
+    month_chart.pack(fill="both", expand=True, padx=10, pady=5)
+
+    # The report on screen; the charts are only redrawn when a different one arrives
+    drawn = {"key": None, "report": None}
+
+    def draw_category_chart(report):
+        items = report.by_category[:CHART_TOP_CATEGORIES]
+        rest = sum((total for _, total in report.by_category[CHART_TOP_CATEGORIES:]), Decimal("0.00"))
+        if rest:
+            items = items + [("Other", rest)]
+        draw_bar_chart(category_chart, "Spending by Category", items, horizontal=True)
+
+    def draw_month_chart(report):
+        draw_bar_chart(month_chart, "Spending by Month", report.by_month)
+
+    def show_reports(event=None):
+        range_name = report_range_var.get()
+
+        def done(report):
+            key = (range_name, report.dates, report.versions)
+            if drawn["key"] == key or range_name != report_range_var.get():
+                return
+            drawn["key"], drawn["report"] = key, report
+            report_total.config(text=f"Total: Rs.{sum((total for _, total in report.by_category), Decimal('0.00'))}")
+            draw_category_chart(report)
+            draw_month_chart(report)
+
+        # Re-checking a range that is already drawn happens silently
+        showing = drawn["key"] is not None and drawn["key"][0] == range_name
+        seen_versions = (shown["expenses"], shown["categories"])
+        run_task(lambda task: session.load_report(range_name, seen_versions), done,
+                 busy_text=None if showing else "Loading reports...", owner=category_chart)
+
+    def on_tab_changed(event):
+        if notebook.select() == str(reports_frame):
+            show_reports()
+
+    notebook.bind("<<NotebookTabChanged>>", on_tab_changed)
+    report_range_combo.bind("<<ComboboxSelected>>", show_reports)
+    category_chart.bind("<Configure>", lambda event: draw_category_chart(drawn["report"]) if drawn["report"] else None)
+    month_chart.bind("<Configure>", lambda event: draw_month_chart(drawn["report"]) if drawn["report"] else None)
 
     nav_frame = tk.Frame(container, bg='white')
     nav_frame.pack(pady=10)
     
     def logout():
         if messagebox.askyesno("Logout", "Are you sure?"):
-            navigate_to(show_main_menu)
+            end_session()
     
     tk.Button(nav_frame, text="Logout", command=logout, bg='lightgray', width=12).pack()
 
 # USER UPDATE EXPENSE
-def user_update_expense(user_id, fullname, expense_data, categories):
-    for widget in window.winfo_children():
-        widget.destroy()
-    
-    set_background_image(window)
-    
+def user_update_expense(session, expense_data, on_saved=None):
     main_frame = create_styled_frame(window)
     main_frame.place(relx=0.5, rely=0.5, anchor='center', width=450, height=400)
 
@@ -1141,7 +4288,7 @@ def user_update_expense(user_id, fullname, expense_data, categories):
     
     tk.Label(form_frame, text="Category:", bg='white').grid(row=2, column=0, sticky="e", padx=5, pady=8)
     
-    category_options = [f"{cat[1]}" for cat in categories]
+    category_options = session.categories.names()
     category_var = tk.StringVar(value=expense_data[3] if expense_data[3] else "")
     category_combo = ttk.Combobox(form_frame, textvariable=category_var, values=category_options, width=23)
     category_combo.grid(row=2, column=1, padx=5, pady=8)
@@ -1153,57 +4300,199 @@ def user_update_expense(user_id, fullname, expense_data, categories):
 
     def submit():
         try:
-            amount = float(amount_entry.get().strip())
-            if amount <= 0:
-                raise ValueError
-        except:
+            amount = parse_amount(amount_entry.get())
+        except ValueError:
             messagebox.showerror("Error", "Invalid amount")
             return
         
         date_str = date_entry.get().strip()
         try:
-            datetime.strptime(date_str, "%Y-%m-%d")
-        except:
+            parse_date(date_str)
+        except ValueError:
             messagebox.showerror("Error", "Invalid date format")
             return
         
         category_name = category_var.get().strip()
-        category_id = None
-        if category_name:
-            for cat in categories:
-                if cat[1] == category_name:
-                    category_id = cat[0]
-                    break
+        category_id = session.categories.id_for(category_name) if category_name else None
         
         note = note_entry.get().strip()
         
-        try:
-            db = db_connection()
-            cur = db.cursor()
-            cur.execute("UPDATE expenses SET amount=%s, spent_on=%s, note=%s, category_ids=%s WHERE id=%s AND user_id=%s",
-                       (amount, date_str, note if note else None, category_id, expense_data[0], user_id))
-            db.commit()
+        def done(change):
             messagebox.showinfo("Success", "Expense updated successfully!")
-            navigate_to(user_dashboard, user_id, fullname)
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            db.close()
+            if on_saved:
+                on_saved(change)
+            go_back()
+
+        run_task(lambda task: modify_expense(session.user.id, expense_data[0], amount, date_str, note if note else None, category_id),
+                 done, busy_text="Updating expense...", owner=main_frame, cancellable=False)
 
     button_frame = tk.Frame(main_frame, bg='white')
     button_frame.pack(pady=20)
     tk.Button(button_frame, text="Update", command=submit, bg='#f39c12', fg='white', width=15).pack(side="left", padx=5)
-    tk.Button(button_frame, text="Cancel", command=lambda: navigate_to(user_dashboard, user_id, fullname), bg='lightgray', width=15).pack(side="left", padx=5)
+    tk.Button(button_frame, text="Cancel", command=go_back, bg='lightgray', width=15).pack(side="left", padx=5)
 
-# MAIN APPLICATION
-if __name__ == "__main__":
+# BENCHMARKS
+BENCH_SIZES = (1000, 100000, 1000000)
+BENCH_PASSWORD = "bench-password"
+BENCH_INSERT_BATCH = 5000
+BENCH_COMMIT_ROWS = 50000
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an unsorted list
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def generate_bench_data(users, categories, sizes, seed=42, progress=None):
+    # Idempotent: existing bench users, categories and rows are reused, so
+    # only the shortfall is inserted on later runs
+    rng = random.Random(seed)
+    password = encrypt_password(BENCH_PASSWORD)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.executemany("INSERT IGNORE INTO categories (category_name) VALUES (%s)",
+                        [(f"Bench {i:03d}",) for i in range(categories)])
+        if cur.rowcount > 0:
+            bump_data_version(cur, "categories")
+        accounts = [(f"Bench User {i}", f"bench_user_{i}", f"bench_user_{i}@example.com", password, "user") for i in range(users)]
+        accounts += [(f"Bench Rows {size}", f"bench_rows_{size}", f"bench_rows_{size}@example.com", password, "user") for size in sizes]
+        for start in range(0, len(accounts), BENCH_INSERT_BATCH):
+            cur.executemany("INSERT IGNORE INTO users (fullname, username, email, password, role) VALUES (%s, %s, %s, %s, %s)",
+                            accounts[start:start + BENCH_INSERT_BATCH])
+        db.commit()
+
+        cur.execute("SELECT category_id FROM categories")
+        category_ids = [row[0] for row in cur.fetchall()] + [None]
+        today = date.today().toordinal()
+        bench_users = {}
+        for size in sizes:
+            cur.execute("SELECT id FROM users WHERE username=%s", (f"bench_rows_{size}",))
+            user_id = cur.fetchone()[0]
+            bench_users[size] = user_id
+            cur.execute("SELECT COUNT(*) FROM expenses WHERE user_id=%s", (user_id,))
+            missing = size - cur.fetchone()[0]
+            inserted = 0
+            while inserted < missing:
+                count = min(BENCH_INSERT_BATCH, missing - inserted)
+                cur.executemany(
+                    "INSERT INTO expenses (user_id, amount, spent_on, note, category_ids) VALUES (%s, %s, %s, %s, %s)",
+                    [(user_id,
+                      Decimal(rng.randint(100, 500000)) / 100,
+                      date.fromordinal(today - rng.randint(0, 5 * 365)),
+                      f"bench note {rng.randint(0, 99999)}" if rng.random() < 0.7 else None,
+                      rng.choice(category_ids)) for _ in range(count)])
+                inserted += count
+                if inserted % BENCH_COMMIT_ROWS < BENCH_INSERT_BATCH or inserted == missing:
+                    db.commit()
+                    if progress:
+                        progress(f"bench_rows_{size}: {inserted:,}/{missing:,} rows generated")
+            if missing > 0:
+                rebuild_rollups(cur, user_id)
+                bump_data_version(cur, expense_version_name(user_id))
+        db.commit()
+        return bench_users
+    finally:
+        db.close()
+
+def time_path(work, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = work()
+        timings.append(time.perf_counter() - start)
+    p50 = percentile(timings, 50)
+    return {
+        "runs": repeat,
+        "rows": rows,
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "rows_per_sec": round(rows / p50, 1) if p50 else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+def bench_paths(user_id, size):
+    # (name, callable returning the number of rows it produced, run once only)
+    db = db_connection()
+    try:
+        cur = db.cursor()
+        cur.execute("""
+            SELECT spent_on, id FROM expenses WHERE user_id=%s
+            ORDER BY spent_on DESC, id DESC LIMIT 1 OFFSET %s
+        """, (user_id, max(size // 2 - 1, 0)))
+        middle = cur.fetchone()
+    finally:
+        db.close()
+    export_path = os.path.join(tempfile.gettempdir(), f"expense_bench_{size}.xlsx")
+
+    def export():
+        try:
+            return export_expenses_xlsx(user_id, export_path)[0]
+        finally:
+            if os.path.exists(export_path):
+                os.remove(export_path)
+
+    return [
+        ("expense_page_first", lambda: len(fetch_expense_page(user_id)), False),
+        ("expense_page_middle", lambda: len(fetch_expense_page(user_id, after=middle)), False),
+        ("expense_totals", lambda: expense_total(user_id).count, False),
+        ("summary_by_month", lambda: len(expense_summary(user_id, "month")), False),
+        ("summary_by_category", lambda: len(expense_summary(user_id, "category")), False),
+        ("rollup_by_month", lambda: len(expense_summary(user_id, "month", use_rollups=True)), False),
+        ("rollup_by_category", lambda: len(expense_summary(user_id, "category", use_rollups=True)), False),
+        ("note_search", lambda: len(search_expenses(user_id, ExpenseFilter(note="bench 1234"))), False),
+        ("login", lambda: 1 if authenticate(f"bench_rows_{size}", BENCH_PASSWORD, "user") else 0, False),
+        # A first login in the process, paying for the full password hash
+        ("login_uncached", lambda: password_cache.clear() or (1 if authenticate(f"bench_rows_{size}", BENCH_PASSWORD, "user") else 0), False),
+        ("users_table", lambda: len(fetch_user_page()), False),
+        ("users_search", lambda: len(fetch_user_page("bench_user_1")), False),
+        ("export_xlsx", export, True),
+    ]
+
+def run_benchmarks(users=1000, categories=32, sizes=BENCH_SIZES, repeat=20, export_repeat=1, seed=42, progress=None):
+    started = time.perf_counter()
+    bench_users = generate_bench_data(users, categories, sizes, seed, progress)
+    results = []
+    for size in sizes:
+        for name, work, expensive in bench_paths(bench_users[size], size):
+            if progress:
+                progress(f"{name} @ {size:,} rows")
+            result = time_path(work, export_repeat if expensive else repeat)
+            result.update({"path": name, "size": size})
+            results.append(result)
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "database": DB_CONFIG["database"],
+        "python": sys.version.split()[0],
+        "users": users,
+        "categories": categories,
+        "sizes": list(sizes),
+        "repeat": repeat,
+        "results": results,
+        "pool": get_pool().stats(),
+        "peak_rss_kb": peak_rss_kb(),
+        "elapsed_sec": round(time.perf_counter() - started, 1),
+    }
+
+# GUI LAUNCH
+def launch_gui():
+    global tk, ttk, messagebox, filedialog, Image, ImageTk, window, tasks
+    import tkinter as tk
     import tkinter.simpledialog
-    
-    # Initialize database and tables on startup
-    initialize_database()
-    
-    # Initialize categories on startup
-    initialize_categories()
+    from tkinter import ttk, messagebox, filedialog
+    from PIL import Image, ImageTk
     
     window = tk.Tk()
     window.title("Expense Tracker System")
@@ -1212,6 +4501,266 @@ if __name__ == "__main__":
     
     window.bind("<Configure>", on_window_resize)
     
-    show_main_menu()
+    tasks = TaskRunner(window)
+    
+    navigate_to(show_main_menu)
     
-    window.mainloop()
\ No newline at end of file
+    window.mainloop()
+    # Stop chunked work once the window is closed. This has to happen here, since the
+    # interpreter joins the worker threads before any atexit handler would run
+    tasks.shutdown()
+
+# COMMAND LINE
+def cli_user(username):
+    user = find_user(username)
+    if not user:
+        raise ValueError(f"No user named '{username}'")
+    return user
+
+def cli_filter(args):
+    category_ids = []
+    if args.category:
+        category_cache.load()
+        for name in args.category:
+            if name.lower() == "uncategorized":
+                category_ids.append(None)
+                continue
+            category_id = category_cache.id_for(name)
+            if category_id is None:
+                raise ValueError(f"Unknown category '{name}'")
+            category_ids.append(category_id)
+    return make_expense_filter(category_ids, args.date_from, args.date_to, args.min_amount, args.max_amount, args.note)
+
+def cli_export(args):
+    user_id = cli_user(args.user)[0]
+    expense_filter = cli_filter(args)
+    def report(rows, rate):
+        print(f"\rExported {rows:,} rows ({rate:,.0f} rows/sec)", end="", file=sys.stderr, flush=True)
+    rows, total_amount, elapsed = export_expenses_xlsx(user_id, args.file, None if args.quiet else report, expense_filter)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Exported {rows} expenses (total Rs.{total_amount}) to {args.file} in {elapsed:.1f}s")
+    return 0
+
+def cli_import(args):
+    user_id = cli_user(args.user)[0]
+    def report(rows, imported, errors, rate):
+        print(f"\rRead {rows:,} rows, imported {imported:,}, {errors:,} errors ({rate:,.0f} rows/sec)",
+              end="", file=sys.stderr, flush=True)
+    result = import_expenses(user_id, args.file, None if args.quiet else report)
+    if not args.quiet:
+        print(file=sys.stderr)
+    rate = result.imported / result.elapsed if result.elapsed else 0
+    print(f"Imported {result.imported} expenses in {result.elapsed:.1f}s ({rate:,.0f} rows/sec)")
+    for line, error in result.errors:
+        print(f"Row {line}: {error}", file=sys.stderr)
+    if result.error_count > len(result.errors):
+        print(f"...and {result.error_count - len(result.errors)} more errors", file=sys.stderr)
+    return 1 if result.error_count else 0
+
+def cli_import_users(args):
+    def report(rows, imported, errors, rate):
+        print(f"\rRead {rows:,} rows, added {imported:,} users, {errors:,} errors ({rate:,.0f} rows/sec)",
+              end="", file=sys.stderr, flush=True)
+    result = import_users(args.file, args.role, None if args.quiet else report)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Added {result.imported} users in {result.elapsed:.1f}s")
+    for line, error in result.errors:
+        print(f"Row {line}: {error}", file=sys.stderr)
+    if result.error_count > len(result.errors):
+        print(f"...and {result.error_count - len(result.errors)} more errors", file=sys.stderr)
+    return 1 if result.error_count else 0
+
+def cli_report(args):
+    user_id = cli_user(args.user)[0]
+    group_by = tuple(args.by or ())
+    rows = expense_summary(user_id, group_by, cli_filter(args), use_rollups=args.rollups)
+    headers = [dimension.capitalize() for dimension in group_by] + ["Count", "Total", "Min", "Max"]
+    table = [list(row.key or ()) + [row.count, row.total, row.smallest, row.largest] for row in rows]
+    if args.format == "json":
+        print(json.dumps([dict(zip([header.lower() for header in headers], values)) for values in table], default=str, indent=2))
+    elif args.format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(headers)
+        writer.writerows(["" if value is None else value for value in values] for values in table)
+    else:
+        widths = [max(len(str(header)), *(len(str(values[i])) for values in table)) if table else len(header)
+                  for i, header in enumerate(headers)]
+        print("  ".join(header.ljust(width) for header, width in zip(headers, widths)).rstrip())
+        for values in table:
+            print("  ".join(str("" if value is None else value).ljust(width) for value, width in zip(values, widths)).rstrip())
+    return 0
+
+def cli_bench(args):
+    sizes = tuple(int(size) for size in args.sizes.split(","))
+    report = run_benchmarks(args.users, args.categories, sizes, args.repeat, args.export_repeat, args.seed,
+                            None if args.quiet else lambda message: print(message, file=sys.stderr))
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+def cli_hash_bench(args):
+    def report(scheme, settings, elapsed):
+        print(f"{scheme}: {', '.join(f'{name}={value}' for name, value in settings.items())} took {elapsed:.0f} ms",
+              file=sys.stderr)
+    results = calibrate_password_hashing(args.target_ms, None if args.quiet else report)
+    print(f"Cost settings for about {args.target_ms:.0f} ms per hash on this machine:")
+    for scheme, settings, elapsed in results:
+        marker = " (current scheme)" if scheme == password_hasher().name else ""
+        print(f"  {scheme}{marker}: {', '.join(f'{name} = {value}' for name, value in settings.items())}  ({elapsed:.0f} ms)")
+    return 0
+
+def cli_rollups(args):
+    user_id = cli_user(args.user)[0] if args.user else None
+    if args.rebuild:
+        groups = rebuild_expense_rollups(user_id)
+        print(f"Rebuilt {groups} rollup rows")
+        return 0
+    mismatches, groups = verify_expense_rollups(user_id)
+    for (owner_id, ym, category_key), expected, stored in mismatches:
+        print(f"user {owner_id} month {ym // 100:04d}-{ym % 100:02d} category {category_key or 'uncategorized'}: "
+              f"expected {expected or 'no row'}, stored {stored or 'no row'}")
+    if mismatches:
+        print(f"{len(mismatches)} of {groups} rollup rows differ - run with --rebuild to fix", file=sys.stderr)
+        return 1
+    print(f"All {groups} rollup rows match the expenses table")
+    return 0
+
+def cli_maintenance(args):
+    jobs = pending_maintenance_jobs()
+    if not jobs:
+        print("No unfinished maintenance jobs")
+        return 0
+    for job in jobs:
+        print(f"Job {job.id}: {job.kind} {job.target_id}, {job.rows_done:,} rows done")
+    if not args.resume:
+        print("Run with --resume to finish them", file=sys.stderr)
+        return 1
+    def report(job, rows_done):
+        print(f"\rJob {job.id}: {rows_done:,} rows done", end="", file=sys.stderr, flush=True)
+    resume_maintenance_jobs(None if args.quiet else report)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Finished {len(jobs)} maintenance jobs")
+    return 0
+
+def cli_check_indexes(args):
+    return 0 if print_query_plan_report() else 1
+
+def add_filter_arguments(parser):
+    parser.add_argument("--category", action="append",
+                        help="only include this category, or Uncategorized (repeatable)")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="only include expenses on or after this date")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="only include expenses on or before this date")
+    parser.add_argument("--min-amount", help="only include expenses of at least this amount")
+    parser.add_argument("--max-amount", help="only include expenses of at most this amount")
+    parser.add_argument("--note", help="full-text search: every word must start a word in the note")
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="expense.py", description="Expense Tracker. Run without a command to open the GUI.")
+    parser.add_argument("--engine", choices=sorted(STORAGE_ENGINES), default=DB_ENGINE,
+                        help="storage engine: a MySQL server, or a local SQLite file (default: %(default)s)")
+    parser.add_argument("--database", help=f"database name (default: {DB_CONFIG['database']}; expense_bench for bench); "
+                                           f"the sqlite engine stores it in <name>.sqlite3 next to this script")
+    parser.add_argument("--profile", metavar="FILE", help="write aggregated timings (JSON) to FILE on exit")
+    parser.add_argument("--slow-ms", type=float, default=SLOW_THRESHOLD_MS,
+                        help="log queries, tasks and screens slower than this (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    export_parser = commands.add_parser("export", help="Export a user's expenses to an .xlsx file")
+    export_parser.add_argument("--user", required=True, help="username whose expenses are exported")
+    export_parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    add_filter_arguments(export_parser)
+    export_parser.add_argument("file", help="output .xlsx path")
+    export_parser.set_defaults(handler=cli_export)
+
+    import_parser = commands.add_parser("import", help="Import expenses from a CSV or .xlsx file")
+    import_parser.add_argument("--user", required=True, help="username the expenses are added to")
+    import_parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    import_parser.add_argument("file", help="input .csv or .xlsx path")
+    import_parser.set_defaults(handler=cli_import)
+
+    import_users_parser = commands.add_parser("import-users", help="Create user accounts from a CSV or .xlsx file")
+    import_users_parser.add_argument("--role", choices=USER_ROLES, default="user",
+                                     help="role for rows without a Role column (default: %(default)s)")
+    import_users_parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    import_users_parser.add_argument("file", help="input .csv or .xlsx path with Full Name, Username, Email and Password columns")
+    import_users_parser.set_defaults(handler=cli_import_users)
+
+    report_parser = commands.add_parser("report", help="Print spending summaries")
+    report_parser.add_argument("--user", required=True, help="username to report on")
+    report_parser.add_argument("--by", action="append", choices=sorted(SUMMARY_DIMENSIONS),
+                               help="group by this dimension (repeatable)")
+    add_filter_arguments(report_parser)
+    report_parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    report_parser.add_argument("--rollups", action="store_true",
+                               help="read the monthly rollup table instead of scanning expenses (no Min/Max; "
+                                    "ignored for amount, note or part-month filters)")
+    report_parser.set_defaults(handler=cli_report)
+
+    bench_parser = commands.add_parser("bench", help="Generate synthetic data and time the data-access paths")
+    bench_parser.add_argument("--users", type=int, default=1000, help="background user accounts to create")
+    bench_parser.add_argument("--categories", type=int, default=32, help="extra categories to create")
+    bench_parser.add_argument("--sizes", default=",".join(str(size) for size in BENCH_SIZES),
+                              help="comma-separated expense counts, one benchmark user per size")
+    bench_parser.add_argument("--repeat", type=int, default=20, help="timed runs per path")
+    bench_parser.add_argument("--export-repeat", type=int, default=1, help="timed runs of the Excel export")
+    bench_parser.add_argument("--seed", type=int, default=42, help="random seed for generated data")
+    bench_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    bench_parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    # Never fill the real database with synthetic rows unless --database says so
+    bench_parser.set_defaults(handler=cli_bench, default_database="expense_bench")
+
+    rollups_parser = commands.add_parser("rollups", help="Verify or rebuild the monthly expense rollups")
+    rollups_parser.add_argument("--user", help="only this username (default: every user)")
+    rollups_parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the expenses table")
+    rollups_parser.set_defaults(handler=cli_rollups)
+
+    maintenance_parser = commands.add_parser("maintenance", help="List or resume interrupted user and category deletions")
+    maintenance_parser.add_argument("--resume", action="store_true", help="finish every unfinished job")
+    maintenance_parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    maintenance_parser.set_defaults(handler=cli_maintenance)
+
+    hash_parser = commands.add_parser("hash-bench", help="Time password hashing and suggest cost settings")
+    hash_parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS,
+                             help="time one hash should take (default: %(default)s)")
+    hash_parser.add_argument("--quiet", action="store_true", help="do not print each measurement")
+    hash_parser.set_defaults(handler=cli_hash_bench, needs_database=False)
+
+    check_parser = commands.add_parser("check-indexes", help="EXPLAIN the dashboard queries and verify index use")
+    check_parser.set_defaults(handler=cli_check_indexes)
+    return parser
+
+def main(argv=None):
+    global DB_ENGINE
+    args = build_arg_parser().parse_args(argv)
+    DB_ENGINE = args.engine
+    DB_CONFIG["database"] = args.database or getattr(args, "default_database", DB_CONFIG["database"])
+    profiler.slow_ms = args.slow_ms
+    atexit.register(report_pool_stats)
+    if args.profile:
+        atexit.register(profiler.dump, args.profile)
+    
+    # Initialize database, tables and categories on startup; batch commands such as
+    # import and report need the predefined categories on a fresh database too
+    if getattr(args, "needs_database", True):
+        initialize_database(verbose=args.command is None)
+        initialize_categories()
+    
+    if args.command is None:
+        launch_gui()
+        return 0
+    try:
+        return args.handler(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+# MAIN APPLICATION
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# Runs the data-access layer end to end against the SQLite engine, so the queries
+# and the SQLITE_REWRITES translations are checked without a MySQL server.
+#   python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import expense  # noqa: E402
+
+saved_settings = {}
+work_dir = None
+
+def setUpModule():
+    global work_dir
+    work_dir = tempfile.mkdtemp(prefix="expense-sqlite-")
+    saved_settings.update(engine=expense.DB_ENGINE, sqlite_dir=expense.SQLITE_DIR,
+                          database=expense.DB_CONFIG["database"])
+    expense.DB_ENGINE = "sqlite"
+    expense.SQLITE_DIR = work_dir
+    expense.DB_CONFIG["database"] = "expense_test"
+    expense._engine = None
+    expense._pool = None
+    expense.category_cache.invalidate()
+    expense.initialize_database(verbose=False)
+    expense.initialize_categories()
+
+def tearDownModule():
+    if expense._pool is not None:
+        expense._pool.close_all()
+    expense._engine = None
+    expense._pool = None
+    expense.DB_ENGINE = saved_settings["engine"]
+    expense.SQLITE_DIR = saved_settings["sqlite_dir"]
+    expense.DB_CONFIG["database"] = saved_settings["database"]
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+user_counter = 0
+
+def new_user():
+    global user_counter
+    user_counter += 1
+    name = f"user{user_counter}"
+    return expense.create_user_account(f"User {user_counter}", name, f"{name}@example.com", "secret", "user")
+
+def category_id(name):
+    expense.category_cache.load()
+    return expense.category_cache.id_for(name)
+
+def write_file(name, text):
+    path = os.path.join(work_dir, name)
+    with open(path, "w", newline="") as f:
+        f.write(text)
+    return path
+
+class SqlRewriteTests(unittest.TestCase):
+    def test_placeholders_and_upserts(self):
+        sql = expense.translate_sql_for_sqlite(
+            "INSERT INTO expense_rollups (user_id, total) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE total = total + VALUES(total), expense_count = expense_count + VALUES(expense_count)")
+        self.assertEqual(sql, "INSERT INTO expense_rollups (user_id, total) VALUES (?, ?) "
+                              "ON CONFLICT DO UPDATE SET total = decimal_add(total, excluded.total), "
+                              "expense_count = expense_count + excluded.expense_count")
+
+    def test_money_sums_use_decimal_sum(self):
+        sql = expense.translate_sql_for_sqlite("SELECT COALESCE(SUM(r.expense_count), 0), SUM(r.total), SUM(e.amount)")
+        self.assertEqual(sql, "SELECT COALESCE(SUM(r.expense_count), 0), decimal_sum(r.total), decimal_sum(e.amount)")
+
+    def test_mysql_functions(self):
+        self.assertEqual(expense.translate_sql_for_sqlite("SELECT YEAR(e.spent_on), MONTH(e.spent_on) FROM DUAL"),
+                         "SELECT CAST(substr(e.spent_on, 1, 4) AS INTEGER), CAST(substr(e.spent_on, 6, 2) AS INTEGER)")
+        self.assertEqual(expense.translate_sql_for_sqlite("INSERT IGNORE INTO t (a) VALUES (%s)"),
+                         "INSERT OR IGNORE INTO t (a) VALUES (?)")
+        self.assertEqual(expense.translate_sql_for_sqlite("DELETE FROM t WHERE a=%s LIMIT %s"),
+                         "DELETE FROM t WHERE rowid IN (SELECT rowid FROM t WHERE a=? LIMIT ?)")
+
+class UserAccountTests(unittest.TestCase):
+    def test_duplicates_are_reported_per_field(self):
+        user_id = new_user()
+        name = f"user{user_counter}"
+        with self.assertRaisesRegex(ValueError, "Username already exists"):
+            expense.create_user_account("Other", name.upper(), "other@example.com", "secret", "user")
+        with self.assertRaisesRegex(ValueError, "Email already exists"):
+            expense.create_user_account("Other", "other", f"{name}@EXAMPLE.com", "secret", "user")
+        self.assertEqual(expense.fetch_user(user_id)[2], name)
+
+    def test_authenticate(self):
+        user_id = new_user()
+        name = f"user{user_counter}"
+        self.assertEqual(expense.authenticate(name, "secret", "user").id, user_id)
+        self.assertIsNone(expense.authenticate(name, "wrong", "user"))
+        self.assertIsNone(expense.authenticate("nobody", "secret", "user"))
+
+    def test_import_users(self):
+        path = write_file("users.csv", "Full Name,Username,Email,Password\n"
+                                       "Bob,bob,bob@example.com,pw\n"
+                                       "Bob Again,bob,bob2@example.com,pw\n"
+                                       ",carl,carl@example.com,pw\n"
+                                       "Cara,cara,cara@example.com,pw\n")
+        result = expense.import_users(path)
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.errors, [(3, "Username already exists"), (4, "Missing fullname")])
+
+class ExpenseTests(unittest.TestCase):
+    def setUp(self):
+        self.user_id = new_user()
+        self.food = category_id("Food")
+
+    def add(self, amount, spent_on, note="", category=None):
+        return expense.insert_expense(self.user_id, Decimal(amount), spent_on, note, category)
+
+    def test_pages_in_both_directions(self):
+        ids = [self.add("1.00", day).expense_id for day in ("2024-01-01", "2024-01-02", "2024-01-02", "2024-01-03")]
+        page = expense.fetch_expense_page(self.user_id)
+        self.assertEqual([row[0] for row in page], [ids[3], ids[2], ids[1], ids[0]])
+        after = expense.fetch_expense_page(self.user_id, after=(date(2024, 1, 2), ids[2]), limit=2)
+        self.assertEqual([row[0] for row in after], [ids[1], ids[0]])
+        before = expense.fetch_expense_page(self.user_id, before=(date(2024, 1, 2), ids[1]), limit=2)
+        self.assertEqual([row[0] for row in before], [ids[3], ids[2]])
+
+    def test_filters_and_search(self):
+        self.add("12.50", "2024-01-05", "coffee beans", self.food)
+        self.add("7.25", "2024-02-10", "bus ticket")
+        self.add("100.00", "2024-02-11", "coffee machine", self.food)
+        coffee = expense.make_expense_filter([self.food], "", "", "", "", "coffee")
+        self.assertEqual(len(expense.fetch_expense_page(self.user_id, coffee)), 2)
+        self.assertEqual(len(expense.search_expenses(self.user_id, coffee)), 2)
+        short = expense.make_expense_filter([], "", "", "", "", "bu")
+        self.assertEqual([row[4] for row in expense.fetch_expense_page(self.user_id, short)], ["bus ticket"])
+        uncategorized = expense.make_expense_filter([None], "", "", "", "", "")
+        self.assertEqual(expense.expense_total(self.user_id, uncategorized).total, Decimal("7.25"))
+
+    def test_totals_are_exact_decimals(self):
+        for index in range(200):
+            self.add("0.10" if index % 2 else "12345678.07", "2024-01-05")
+        expected = Decimal("0.10") * 100 + Decimal("12345678.07") * 100
+        self.assertEqual(expense.expense_total(self.user_id).total, expected)
+        by_year = expense.expense_summary(self.user_id, ("year",), use_rollups=True)
+        self.assertEqual([(row.key, row.total) for row in by_year], [((2024,), expected)])
+        self.assertEqual(expense.verify_expense_rollups(self.user_id)[0], [])
+
+    def test_changes_keep_rollups_exact(self):
+        first = self.add("12.50", "2024-01-05", "a", self.food)
+        second = self.add("7.25", "2024-02-10", "b")
+        expense.modify_expense(self.user_id, second.expense_id, Decimal("8.00"), "2024-03-10", "b", self.food)
+        expense.recategorize_expenses(self.user_id, [first.expense_id], None)
+        expense.remove_expenses(self.user_id, [second.expense_id])
+        summary = expense.expense_total(self.user_id)
+        self.assertEqual((summary.count, summary.total), (1, Decimal("12.50")))
+        self.assertEqual(expense.verify_expense_rollups(self.user_id)[0], [])
+
+    def test_import_expenses(self):
+        path = write_file("expenses.csv", "Amount,Date,Category,Note\n"
+                                          "5,2024-03-01,Food,a\n"
+                                          "6,2024-03-02,,b\n"
+                                          "x,2024-01-01,,\n"
+                                          "7,2024-03-03,Nope,\n")
+        result = expense.import_expenses(self.user_id, path)
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.errors, [(4, "Invalid amount"), (5, "Unknown category 'Nope'")])
+        self.assertEqual(expense.expense_total(self.user_id).total, Decimal("11.00"))
+
+    def test_cancelled_import_keeps_committed_rows(self):
+        path = write_file("many.csv", "Amount,Date\n" + "1.00,2024-01-01\n" * 10)
+        calls = []
+
+        def progress(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise expense.TaskCancelled()
+
+        original = expense.IMPORT_BATCH_SIZE
+        expense.IMPORT_BATCH_SIZE = 3
+        try:
+            result = expense.import_expenses(self.user_id, path, progress)
+        finally:
+            expense.IMPORT_BATCH_SIZE = original
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.imported, 6)
+        self.assertEqual(expense.expense_total(self.user_id).count, 6)
+        self.assertEqual(expense.verify_expense_rollups(self.user_id)[0], [])
+
+    def test_export(self):
+        try:
+            import openpyxl
+        except ImportError:
+            self.skipTest("openpyxl is not installed")
+        self.add("5.00", "2024-03-01", "a", self.food)
+        self.add("6.00", "2024-03-02", "b")
+        path = os.path.join(work_dir, f"export{self.user_id}.xlsx")
+        expense.export_expenses_xlsx(self.user_id, path)
+        rows = list(openpyxl.load_workbook(path, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(len([row for row in rows if isinstance(row[0], int)]), 2)
+
+    def test_reports_are_keyed_by_range_dates(self):
+        self.add("5.00", "2024-03-01", "a", self.food)
+        reports = expense.ReportCache()
+        report = reports.load(self.user_id, "All time")
+        self.assertEqual(report.by_category, [("Food", Decimal("5.00"))])
+        self.assertIs(reports.load(self.user_id, "All time"), report)
+        self.assertEqual(reports.load(self.user_id, "This year").dates[0], date(date.today().year, 1, 1))
+
+class MaintenanceTests(unittest.TestCase):
+    def setUp(self):
+        self.chunk_size = expense.MAINTENANCE_CHUNK_SIZE
+        expense.MAINTENANCE_CHUNK_SIZE = 3
+
+    def tearDown(self):
+        expense.MAINTENANCE_CHUNK_SIZE = self.chunk_size
+
+    def test_interrupted_user_delete_keeps_rollups_exact(self):
+        user_id = new_user()
+        for index in range(8):
+            expense.insert_expense(user_id, Decimal("1.00"), f"2024-0{index % 3 + 1}-05", "", None)
+
+        def stop(rows_done):
+            raise expense.TaskCancelled()
+
+        with self.assertRaises(expense.TaskCancelled):
+            expense.remove_user(user_id, stop)
+        summary = expense.expense_total(user_id)
+        self.assertEqual((summary.count, summary.total), (5, Decimal("5.00")))
+        self.assertEqual(expense.verify_expense_rollups(user_id)[0], [])
+        expense.resume_maintenance_jobs()
+        self.assertIsNone(expense.fetch_user(user_id))
+        self.assertEqual(expense.verify_expense_rollups(user_id), ([], 0))
+
+    def test_category_delete_moves_expenses_to_uncategorized(self):
+        user_id = new_user()
+        temporary = expense.insert_category("Temporary")
+        for index in range(7):
+            expense.insert_expense(user_id, Decimal("2.00"), "2024-05-01", "", temporary)
+        expense.remove_category(temporary)
+        uncategorized = expense.make_expense_filter([None], "", "", "", "", "")
+        self.assertEqual(expense.expense_total(user_id, uncategorized).count, 7)
+        self.assertEqual(expense.verify_expense_rollups(user_id)[0], [])
+        self.assertIsNone(category_id("Temporary"))
+
+if __name__ == "__main__":
+    unittest.main()